@@ -2,17 +2,30 @@ from fastapi import FastAPI , Depends , UploadFile , File , HTTPException , stat
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from db.db import get_db
-from models.models import User , Document , BlacklistedAccessTokens , RefreshToken 
+from models.models import User , Document , BlacklistedAccessTokens , RefreshToken , IngestBatch , IngestBatchItem
 from db.db import Base , engine
-from schemas.schemas import User_schema , RefreshTokenRequest , LogoutRequest , ChatRequest
+from schemas.schemas import User_schema , RefreshTokenRequest , LogoutRequest , ChatRequest , ChatSessionRequest , ChatMessageRequest
 from auth.auth import hash_password , authenticate_user , create_tokens , oauth2_scheme , ALGORITHN , SECRET_KEY , get_current_user , verify_refresh_token , refresh_access_token
 from fastapi.security import OAuth2PasswordRequestForm
 from jose import jwt , JWTError
 from datetime import datetime , timedelta
 import os
+import threading
+import time
 from services.document_processor import document_processor 
 from auth.helper_fun import chat_groq_model
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi import Request , Query
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from services import bulk_ingest
+from services.response_cache import cached_response , document_version
+from services.rate_limit import chat_user , upload_user
+from services.conversation import conversation_store , answer_turn , build_chat_prompt
+from fastapi.responses import JSONResponse , PlainTextResponse
+from config import settings
+from services import metrics
+from services.metrics import stage , BYTES_INGESTED
 
 
 app = FastAPI()
@@ -35,6 +48,80 @@ app.add_middleware(
 Base.metadata.create_all(bind=engine)
 
 
+async def timing_middleware(request: Request, call_next):
+    token = metrics.start_request_timings()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        server_timing = metrics.finish_request_timings(token)
+
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"    # route template, keeps the label cardinality bounded
+    metrics.HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, path=path, status=response.status_code)
+
+    total = f"total;dur={elapsed * 1000:.1f}"
+    response.headers["Server-Timing"] = f"{server_timing}, {total}" if server_timing else total
+    return response
+
+
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# with METRICS_ENABLED=false neither is registered, requests don't go through the middleware at all
+if settings.METRICS_ENABLED:
+    app.middleware("http")(timing_middleware)
+    app.get("/metrics")(prometheus_metrics)
+
+
+def _warm_up_embeddings():
+    # retried with backoff until it works: with EMBEDDING_BACKEND=sidecar the worker may start before the sidecar,
+    # and /health/ready has to turn 200 once it is up
+    delay = settings.PREWARM_RETRY_INITIAL_SECONDS
+    while True:
+        try:
+            document_processor.warm_up()
+            return
+        except Exception as e:
+            print(f"Warning: embedding model failed to load, retrying in {delay:.0f}s: {e}")
+        time.sleep(delay)
+        delay = min(delay * 2, settings.PREWARM_RETRY_MAX_SECONDS)
+
+
+@app.on_event("startup")
+def prewarm_models():
+    # in a thread so the worker starts accepting requests (login, signup ...) while the model loads
+    if settings.PREWARM_EMBEDDINGS:
+        threading.Thread(target=_warm_up_embeddings, name="embedding-warmup", daemon=True).start()
+
+
+@app.get("/health/live")
+def health_live():
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def health_ready():
+    if document_processor.is_ready:
+        model_status = "ready"
+    elif document_processor.load_error:
+        model_status = "failed"
+    else:
+        model_status = "loading"
+
+    body = {
+        "status": model_status,
+        "embedding_model": settings.EMBEDDING_MODEL,
+        "model_load_seconds": document_processor.load_seconds,
+        "error": document_processor.load_error
+    }
+    if not document_processor.is_ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+    return body
+
+
 @app.post("/Signup")
 def signup_user(user : User_schema , db : Session = Depends(get_db)):
     existing_user = db.query(User).filter(User.email == user.email).first()
@@ -54,7 +141,8 @@ def signup_user(user : User_schema , db : Session = Depends(get_db)):
 
 @app.post("/login")
 def login_user(form_data : OAuth2PasswordRequestForm = Depends(), db:Session = Depends(get_db)):
-    auth_user = authenticate_user(email=form_data.username , password=form_data.password,db=db)
+    with stage("authenticate"):
+        auth_user = authenticate_user(email=form_data.username , password=form_data.password,db=db)
     
     if auth_user is False:
         raise HTTPException(
@@ -69,14 +157,16 @@ def login_user(form_data : OAuth2PasswordRequestForm = Depends(), db:Session = D
     }
 
 
-    tokens = create_tokens(user,db)
+    with stage("create_tokens"):
+        tokens = create_tokens(user,db)
 
     return tokens
 
 @app.post("/refresh")
 def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_db)):
     try:
-        new_tokens = refresh_access_token(request.refresh_token, db)
+        with stage("refresh_tokens"):
+            new_tokens = refresh_access_token(request.refresh_token, db)
         return new_tokens
     
     except HTTPException as e:
@@ -161,7 +251,7 @@ def logout(request : LogoutRequest, db: Session = Depends(get_db) , token = Depe
         )
     
 @app.post("/uploadFile")
-async def upload_file(file : UploadFile = File(...) , current_user = Depends(get_current_user) , db : Session = Depends(get_db)):
+async def upload_file(file : UploadFile = File(...) , current_user = Depends(upload_user) , db : Session = Depends(get_db)):
     try:
         allowed_file_types = ['application/pdf' , 'docx' , 'txt']
         if file.content_type not in allowed_file_types:
@@ -170,8 +260,10 @@ async def upload_file(file : UploadFile = File(...) , current_user = Depends(get
                 detail=f"invalid file type , only allowed {allowed_file_types}"
             )        
 
-        file_content = await file.read()
+        with stage("read_upload"):
+            file_content = await file.read()
         file_size = len(file_content)
+        BYTES_INGESTED.inc(file_size)
         
         upload_dir = "uploads"
         if not os.path.exists(upload_dir):
@@ -180,8 +272,9 @@ async def upload_file(file : UploadFile = File(...) , current_user = Depends(get
         file_name = f"{current_user.id}_{datetime.utcnow().timestamp()}_{file.filename}"
         file_path = os.path.join(upload_dir, file_name)
         
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        with stage("save_file"):
+            with open(file_path, "wb") as f:
+                f.write(file_content)
         
         new_document = Document(
             user_id=current_user.id,
@@ -190,11 +283,16 @@ async def upload_file(file : UploadFile = File(...) , current_user = Depends(get
             upload_time=datetime.utcnow()
         )
         
-        db.add(new_document)
-        db.commit()
-        db.refresh(new_document)
+        with stage("db_insert"):
+            db.add(new_document)
+            db.commit()
+            db.refresh(new_document)
         
-        loaded_doc = document_processor.process_and_store_document_chromadb(file_path=file_path , file_type=file.content_type , user_id=current_user.id ,document_id=new_document.file_id ,db=db)
+        # loading, chunking and embedding take seconds, off the event loop so the worker keeps serving (and admitting) other requests
+        loaded_doc = await run_in_threadpool(
+            document_processor.process_and_store_document_chromadb,
+            file_path=file_path , file_type=file.content_type , user_id=current_user.id , document_id=new_document.file_id , db=db
+        )
 
 
         return [
@@ -220,32 +318,124 @@ async def upload_file(file : UploadFile = File(...) , current_user = Depends(get
     
     
 
-@app.post("/ShowDocuments")
-def process_documents(current_user = Depends(get_current_user) , db : Session = Depends(get_db)):
+@app.post("/uploadFiles")
+async def upload_files(request : Request , current_user = Depends(upload_user) , db : Session = Depends(get_db)):
+    # the form is parsed here and not with File(...): FastAPI would use starlette's default limit of 1000 files
+    async with request.form(max_files=settings.BULK_MAX_FILES) as form:
+        files = [upload for upload in form.getlist("files") if isinstance(upload, StarletteUploadFile)]
+        if not files:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="no files in the 'files' field")
+
+        batch_id = bulk_ingest.new_batch_id()
+
+        try:
+            with stage("stage_uploads"):
+                staged_files, skipped = await run_in_threadpool(bulk_ingest.stage_uploads, files, current_user.id, batch_id)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if not staged_files:
+        bulk_ingest.discard_batch(current_user.id, batch_id)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "no supported files in the upload", "skipped": [{"file_name": n, "reason": r} for n, r in skipped]}
+        )
+
+    try:
+        with stage("db_insert"):
+            tasks = await run_in_threadpool(bulk_ingest.create_batch, staged_files, current_user.id, batch_id, db)
+    except Exception as e:
+        bulk_ingest.discard_batch(current_user.id, batch_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Bulk upload failed: {str(e)}"
+        )
+
+    bulk_ingest.start_batch(tasks, batch_id, current_user.id)
+
+    return {
+        "message": "Files uploaded, processing started",
+        "batch_id": batch_id,
+        "total_files": len(tasks),
+        "skipped": [{"file_name": name, "reason": reason} for name, reason in skipped],
+        "status_url": f"/uploadFiles/{batch_id}"
+    }
+
+
+@app.get("/uploadFiles/{batch_id}")
+def upload_files_status(batch_id : str , include_items : bool = False , current_user = Depends(get_current_user) , db : Session = Depends(get_db)):
+    batch = db.query(IngestBatch).filter(
+        IngestBatch.batch_id == batch_id,
+        IngestBatch.user_id == current_user.id
+    ).first()
+
+    if not batch:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch not found")
+
+    processed = batch.completed_files + batch.failed_files
+    result = {
+        "batch_id": batch.batch_id,
+        "status": batch.status,
+        "total_files": batch.total_files,
+        "completed_files": batch.completed_files,
+        "failed_files": batch.failed_files,
+        "pending_files": batch.total_files - processed,
+        "progress": round(processed / batch.total_files, 4) if batch.total_files else 1.0,
+        "total_bytes": batch.total_bytes,
+        "created_at": batch.created_at,
+        "finished_at": batch.finished_at
+    }
+
+    items = db.query(IngestBatchItem).filter(IngestBatchItem.batch_id == batch_id)
+    if not include_items:
+        items = items.filter(IngestBatchItem.status == "failed")
+    result["items" if include_items else "failures"] = [
+        {
+            "document_id": item.document_id,
+            "file_name": item.file_name,
+            "status": item.status,
+            "error": item.error
+        }
+        for item in items.all()
+    ]
+    return result
+
+
+@app.api_route("/ShowDocuments", methods=["GET", "POST"])
+def process_documents(request : Request , current_user = Depends(get_current_user) , db : Session = Depends(get_db)):
     user_documents = db.query(Document).filter(
         Document.user_id == current_user.id,
         Document.processing_status == "completed"
     ).all()
 
-    results = []
-
-    for doc in user_documents:
-        collection_name = doc.collection_name
-        vector_store = document_processor.get_vector_store(collection_name)
-        all_chunks = vector_store.get()
-        results.append({
-            "file_id": doc.file_id,
-            "collection_name": collection_name,
-            "chunk_count": len(all_chunks['documents']),
-            "chunks": all_chunks['documents'], 
-            "metadata": all_chunks['metadatas']  
-        })
+    # completed documents are immutable, so the rows alone decide the ETag and chroma is only read on a miss
+    etag = document_version(user_documents)
+
+    def build():
+        results = []
+
+        for doc in user_documents:
+            collection_name = doc.collection_name
+            with stage("vector_store_get"):
+                vector_store = document_processor.get_vector_store(collection_name)
+                all_chunks = vector_store.get()
+            results.append({
+                "file_id": doc.file_id,
+                "collection_name": collection_name,
+                "chunk_count": len(all_chunks['documents']),
+                "chunks": all_chunks['documents'], 
+                "metadata": all_chunks['metadatas']  
+            })
         return {"documents": results}
-    
-@app.post("/chat")
-def chat(request : ChatRequest ,current_user = Depends(get_current_user) , db : Session = Depends(get_db)):
+
+    return cached_response(request, f"documents:{current_user.id}", etag, build)
+
+
+@app.get("/documents/{file_id}/chunks")
+def document_chunks(file_id : int , request : Request , offset : int = Query(0, ge=0) , limit : int = Query(50, ge=1, le=500) ,
+                    current_user = Depends(get_current_user) , db : Session = Depends(get_db)):
     document = db.query(Document).filter(
-        Document.file_id == request.document_id,
+        Document.file_id == file_id,
         Document.user_id == current_user.id,
         Document.processing_status == "completed"
     ).first()
@@ -255,29 +445,56 @@ def chat(request : ChatRequest ,current_user = Depends(get_current_user) , db :
             status_code=404,
             detail="Document not found or not ready"
         )
+
+    etag = document_version([document])
+
+    def build():
+        with stage("vector_store_get"):
+            vector_store = document_processor.get_vector_store(document.collection_name)
+            page = vector_store.get(limit=limit, offset=offset)
+        return {
+            "file_id": document.file_id,
+            "collection_name": document.collection_name,
+            "chunk_count": document.chunk_count,
+            "offset": offset,
+            "limit": limit,
+            "chunks": [
+                {"content": content, "metadata": metadata}
+                for content, metadata in zip(page['documents'], page['metadatas'])
+            ]
+        }
+
+    return cached_response(request, f"chunks:{file_id}:{offset}:{limit}", etag, build)
     
-    vector_store = document_processor.get_vector_store(document.collection_name)
+@app.post("/chat")
+def chat(request : ChatRequest ,current_user = Depends(chat_user) , db : Session = Depends(get_db)):
+    with stage("db_lookup"):
+        document = db.query(Document).filter(
+            Document.file_id == request.document_id,
+            Document.user_id == current_user.id,
+            Document.processing_status == "completed"
+        ).first()
 
-    relevant_chunks = vector_store.similarity_search(
-        query=request.query,  
-        k=5  
-    )
+    if not document:
+        raise HTTPException(
+            status_code=404,
+            detail="Document not found or not ready"
+        )
+    
+    with stage("retrieval"):
+        vector_store = document_processor.get_vector_store(document.collection_name)
+
+        relevant_chunks = vector_store.similarity_search(
+            query=request.query,  
+            k=5  
+        )
 
     context = "\n\n".join([chunk.page_content for chunk in relevant_chunks])
 
-    prompt = f"""
-    You are a helpful assistant. Answer the question based on the context below.
-    
-    Context from document '{document.file_id}':
-    {context}
-    
-    Question: {request.query}
-    
-    Answer: Provide a helpful answer based only on the context above. 
-    If the answer is not in the context, say "I cannot find this information in the document."
-    """
+    prompt = build_chat_prompt(document.file_id, context, request.query)
 
-    llm_response = chat_groq_model(prompt , context)
+    with stage("llm"):
+        llm_response = chat_groq_model(prompt , context)
 
     return {
         "query": request.query,
@@ -321,8 +538,63 @@ def chat(request : ChatRequest ,current_user = Depends(get_current_user) , db :
     """
 
 
+@app.post("/chat/sessions")
+def create_chat_session(request : ChatSessionRequest , current_user = Depends(get_current_user) , db : Session = Depends(get_db)):
+    document = db.query(Document).filter(
+        Document.file_id == request.document_id,
+        Document.user_id == current_user.id,
+        Document.processing_status == "completed"
+    ).first()
+
+    if not document:
+        raise HTTPException(
+            status_code=404,
+            detail="Document not found or not ready"
+        )
+
+    session = conversation_store.create(db, current_user.id, document.file_id, document.collection_name)
+    return {
+        "session_id": session.session_id,
+        "document_id": document.file_id,
+        "created_at": session.created_at
+    }
 
-    
 
+@app.post("/chat/sessions/{session_id}/messages")
+def chat_session_message(session_id : str , request : ChatMessageRequest , current_user = Depends(chat_user) , db : Session = Depends(get_db)):
+    session = conversation_store.get(db, session_id, current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+
+    vector_store = document_processor.get_vector_store(session.collection_name)
+    try:
+        result = answer_turn(session, request.query, vector_store, document_processor.embeddings, chat_groq_model)
+        conversation_store.add_turn(db, session, request.query, result["answer"])
+        return result
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Chat failed: {str(e)}"
+        )
+
+
+@app.get("/chat/sessions/{session_id}")
+def get_chat_session(session_id : str , current_user = Depends(get_current_user) , db : Session = Depends(get_db)):
+    session = conversation_store.get(db, session_id, current_user.id, full_history=True)
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+
+    return {
+        "session_id": session.session_id,
+        "document_id": session.document_id,
+        "created_at": session.created_at,
+        "updated_at": session.updated_at,
+        "history": [{"query": query, "answer": answer} for query, answer in session.history]
+    }
 
 
+@app.delete("/chat/sessions/{session_id}")
+def delete_chat_session(session_id : str , current_user = Depends(get_current_user) , db : Session = Depends(get_db)):
+    if not conversation_store.delete(db, session_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    return {"message": "Chat session deleted"}
@@ -12,6 +12,7 @@ from jose import JWTError, jwt
 import secrets
 import uuid
 from db.db import get_db
+from services.metrics import stage
 
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
@@ -43,9 +44,10 @@ def authenticate_user(email : str , password : str ,db:Session):
 
 def get_current_user( token : str = Depends(oauth2_scheme) ,
         db : Session = Depends(get_db)):
-    payload = verify_token(token, db)
-    user_email = payload.get("email")
-    user = db.query(User).filter(User.email == user_email).first()
+    with stage("auth"):
+        payload = verify_token(token, db)
+        user_email = payload.get("email")
+        user = db.query(User).filter(User.email == user_email).first()
     if not user :
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND , detail="no user found with this information"
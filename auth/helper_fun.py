@@ -5,7 +5,6 @@ from decimal import Decimal
 from uuid import UUID
 from sqlalchemy.orm import Session
 from models.models import User
-from groq import Groq
 from config import settings
 
 # def is_token_revoked(jti : int , db:Session):
@@ -23,7 +22,9 @@ from config import settings
 #     db.commit()
 
 def chat_groq_model(query : str , context : str) -> str:
-    client = Groq(api_key=settings.groq_api_key)
+    from groq import Groq
+
+    client = Groq(api_key=settings.groq_api_key, base_url=settings.GROQ_BASE_URL)
     try:
         response = client.chat.completions.create(
             model="openai/gpt-oss-120b",
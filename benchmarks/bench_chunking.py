@@ -0,0 +1,119 @@
+"""
+Benchmark: chunking strategies
+
+python -m benchmarks.bench_chunking --files 12 --paragraphs 60 --queries-per-doc 10
+
+for every variant (strategy + size unit) over the same synthetic corpus:
+- chunk_count, embedded_tokens        how much text goes through the model
+- truncated_tokens                    tokens past the model's max_seq_length, silently dropped by the model
+- embed_seconds                       wall time of embed_documents over all chunks
+- hit_rate_at_5                       a sentence of the document (with every 4th word dropped) is the query,
+                                      hit when one of the top 5 chunks of that document contains the sentence,
+                                      i.e. the same per document search /chat does
+"""
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import numpy as np
+
+from benchmarks.corpus import generate_corpus
+from config import settings
+from services.document_processor import DocumentProcessor, build_local_embeddings
+
+
+VARIANTS = [
+    {"name": "recursive-1000chars", "strategy": "recursive", "CHUNK_UNIT": "characters"},
+    {"name": "recursive-tokens", "strategy": "recursive", "CHUNK_UNIT": "tokens"},
+    {"name": "structure-tokens", "strategy": "structure", "CHUNK_UNIT": "tokens"},
+    {"name": "page-tokens", "strategy": "page", "CHUNK_UNIT": "tokens"},
+]
+
+
+def sample_queries(rng: random.Random, text: str, count: int):
+    sentences = [s.strip() for s in re.split(r"(?<=\.)\s+", text) if len(s.split()) >= 8]
+    picked = rng.sample(sentences, min(count, len(sentences)))
+    return [(" ".join(w for i, w in enumerate(s.split()) if i % 4 != 3), s) for s in picked]
+
+
+def normalize_space(text: str) -> str:
+    return " ".join(text.split())
+
+
+def run_variant(variant, processor, model, loaded, max_tokens: int, queries_per_doc: int, seed: int) -> dict:
+    original_unit = settings.CHUNK_UNIT
+    settings.CHUNK_UNIT = variant["CHUNK_UNIT"]
+    try:
+        per_doc_chunks = [processor.chunker.split(documents, file_type, variant["strategy"])
+                          for documents, file_type in loaded]
+    finally:
+        settings.CHUNK_UNIT = original_unit
+
+    count_tokens = processor.chunker._token_counter
+    all_chunks = [chunk.page_content for chunks in per_doc_chunks for chunk in chunks]
+    token_counts = [count_tokens(text) for text in all_chunks]
+
+    start = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(all_chunks), dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    hits = total = 0
+    offset = 0
+    for (documents, _), chunks in zip(loaded, per_doc_chunks):
+        doc_vectors = vectors[offset:offset + len(chunks)]
+        offset += len(chunks)
+        texts = [normalize_space(chunk.page_content) for chunk in chunks]
+        full_text = " ".join(d.page_content for d in documents)
+
+        for query, sentence in sample_queries(rng, full_text, queries_per_doc):
+            query_vector = np.asarray(model.embed_query(query), dtype=np.float32)
+            top = np.argsort(-(doc_vectors @ query_vector))[:5]
+            total += 1
+            hits += any(normalize_space(sentence) in texts[i] for i in top)
+
+    return {
+        "variant": variant["name"],
+        "chunk_count": len(all_chunks),
+        "embedded_tokens": int(sum(min(t, max_tokens) for t in token_counts)),
+        "truncated_tokens": int(sum(max(0, t - max_tokens) for t in token_counts)),
+        "chunks_truncated": int(sum(t > max_tokens for t in token_counts)),
+        "embed_seconds": round(embed_seconds, 3),
+        "hit_rate_at_5": round(hits / total, 4) if total else None,
+        "queries": total
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=12)
+    parser.add_argument("--paragraphs", type=int, default=60)
+    parser.add_argument("--queries-per-doc", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    processor = DocumentProcessor()
+    model = build_local_embeddings()
+    model.embed_query("warm up")
+    # word pieces the model actually sees, minus [CLS] and [SEP]
+    max_tokens = model._client.max_seq_length - 2
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = generate_corpus(directory, args.files, args.paragraphs, args.seed)
+        loaded = [(processor.load_document(path, file_type), file_type) for path, file_type in corpus]
+
+        results = [run_variant(v, processor, model, loaded, max_tokens, args.queries_per_doc, args.seed)
+                   for v in VARIANTS]
+
+    print(json.dumps({"files": args.files, "max_tokens": max_tokens, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
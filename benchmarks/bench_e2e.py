@@ -0,0 +1,393 @@
+"""
+End to end benchmark
+
+python -m benchmarks.bench_e2e --files 30 --users 4 --concurrency 8 --chats 200 --output results.json
+
+- generates a synthetic pdf/docx/txt corpus (benchmarks/corpus.py)
+- starts benchmarks/fake_groq.py and the API under uvicorn in a scratch directory
+  (own sqlite db, uploads and vector store, so the run never touches the repo's data)
+- drives /Signup, /login, /refresh, /uploadFile, /ShowDocuments and /chat concurrently with httpx,
+  first one endpoint per phase, then a "mixed" phase with uploads, chats, listings and refreshes all
+  in flight together (stats per endpoint inside it), which is where /chat vs /uploadFile contention shows
+- reports per endpoint throughput and p50/p95/p99 latency, server peak RSS (server + workers)
+  and disk growth of the scratch directory as json
+
+same arguments + same --seed give the same corpus and request mix (the mixed phase is shuffled with the seed),
+so two json files can be diffed run to run
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.fake_groq import start_fake_groq
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHAT_QUERIES = [
+    "What is this document about?",
+    "Summarise the first section",
+    "What does the document say about latency?",
+    "Which results are reported?",
+    "What are the payment terms?",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def _process_tree(pid: int):
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            for child in f.read().split():
+                pids.extend(_process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler:
+    """Polls /proc for the RSS of the server and its worker processes (linux only)."""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, sum(_rss_bytes(pid) for pid in _process_tree(self.pid)))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Phase:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self.transport_errors = 0
+        self.status_codes = {}
+        self.start = None
+        self.elapsed = None
+
+    async def call(self, client: httpx.AsyncClient, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.errors += 1
+            self.transport_errors += 1
+            return None
+        self.latencies.append(time.perf_counter() - start)
+        self.status_codes[response.status_code] = self.status_codes.get(response.status_code, 0) + 1
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+    def summary(self) -> dict:
+        requests = len(self.latencies) + self.transport_errors
+        ms = lambda value: round(value * 1000, 2) if value is not None else None
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "status_codes": {str(code): count for code, count in sorted(self.status_codes.items())},
+            "elapsed_seconds": round(self.elapsed, 3),
+            "throughput_rps": round(requests / self.elapsed, 2) if self.elapsed else None,
+            "p50_ms": ms(percentile(self.latencies, 50)),
+            "p95_ms": ms(percentile(self.latencies, 95)),
+            "p99_ms": ms(percentile(self.latencies, 99)),
+        }
+
+
+async def run_phase(name: str, jobs, concurrency: int, results: dict):
+    phase = Phase(name)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(job):
+        async with semaphore:
+            return await job(phase)
+
+    start = time.perf_counter()
+    outputs = await asyncio.gather(*(limited(job) for job in jobs))
+    phase.elapsed = time.perf_counter() - start
+    results[name] = phase.summary()
+    return outputs
+
+
+async def run_mixed(name: str, jobs, concurrency: int, results: dict):
+    """jobs is [(endpoint, job)], all of them run together under one concurrency limit, stats per endpoint."""
+    phases = {endpoint: Phase(endpoint) for endpoint, _ in jobs}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(endpoint, job):
+        async with semaphore:
+            return await job(phases[endpoint])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited(endpoint, job) for endpoint, job in jobs))
+    elapsed = time.perf_counter() - start
+    for phase in phases.values():
+        phase.elapsed = elapsed
+    results[name] = {endpoint: phase.summary() for endpoint, phase in sorted(phases.items())}
+
+
+async def drive(base_url: str, corpus, args) -> dict:
+    results = {}
+    auth = lambda token: {"Authorization": f"Bearer {token}"}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        users = [{"name": f"bench{i:03d}", "email": f"bench{i:03d}@example.com", "password": "benchpass"}
+                 for i in range(args.users)]
+
+        def signup(user):
+            async def job(phase):
+                return await phase.call(client, "POST", "/Signup", json=user)
+            return job
+        await run_phase("signup", [signup(user) for user in users], args.concurrency, results)
+
+        def login(user):
+            async def job(phase):
+                response = await phase.call(client, "POST", "/login",
+                                            data={"username": user["email"], "password": user["password"]})
+                return response.json() if response is not None and response.status_code == 200 else None
+            return job
+        logins = [login(users[i % len(users)]) for i in range(max(args.logins, len(users)))]
+        tokens = await run_phase("login", logins, args.concurrency, results)
+        sessions = {}
+        for i, token in enumerate(tokens):
+            if token:
+                sessions[users[i % len(users)]["email"]] = token
+        sessions = list(sessions.values())
+        if not sessions:
+            raise RuntimeError("no user could log in, check the server log")
+
+        # a refresh revokes the previous token, so each user refreshes in sequence with its newest one
+        def refresh_chain(session):
+            async def job(phase):
+                for _ in range(args.refreshes):
+                    response = await phase.call(client, "POST", "/refresh",
+                                                json={"refresh_token": session["refresh_token"]})
+                    if response is None or response.status_code != 200:
+                        return
+                    session.update(response.json())
+            return job
+        await run_phase("refresh", [refresh_chain(session) for session in sessions], args.concurrency, results)
+
+        def upload(path, content_type, session):
+            async def job(phase):
+                with open(path, "rb") as f:
+                    content = f.read()
+                response = await phase.call(
+                    client, "POST", "/uploadFile",
+                    files={"file": (os.path.basename(path), content, content_type)},
+                    headers=auth(session["access_token"])
+                )
+                if response is None or response.status_code != 200:
+                    return None
+                processed = response.json()[0]
+                return (session, processed.get("file_id ", processed.get("file_id")))
+            return job
+        uploads = [upload(path, content_type, sessions[i % len(sessions)])
+                   for i, (path, content_type) in enumerate(corpus)]
+        documents = [doc for doc in await run_phase("upload", uploads, args.concurrency, results) if doc]
+
+        def show(session):
+            async def job(phase):
+                return await phase.call(client, "POST", "/ShowDocuments", headers=auth(session["access_token"]))
+            return job
+        await run_phase("show_documents", [show(sessions[i % len(sessions)]) for i in range(args.shows)],
+                        args.concurrency, results)
+
+        def chat(session, document_id, query):
+            async def job(phase):
+                return await phase.call(client, "POST", "/chat",
+                                        json={"document_id": document_id, "query": query},
+                                        headers=auth(session["access_token"]))
+            return job
+        if documents:
+            chats = [chat(*documents[i % len(documents)], CHAT_QUERIES[i % len(CHAT_QUERIES)])
+                     for i in range(args.chats)]
+            await run_phase("chat", chats, args.concurrency, results)
+
+        # the phases above measure every endpoint alone, this one runs them against each other:
+        # uploads embedding documents while /chat embeds queries is the contention that matters
+        if documents and args.mixed_rounds:
+            mixed = []
+            for i in range(args.mixed_rounds):
+                path, content_type = corpus[i % len(corpus)]
+                mixed.append(("upload", upload(path, content_type, sessions[i % len(sessions)])))
+                for j in range(args.mixed_chats_per_upload):
+                    n = i * args.mixed_chats_per_upload + j
+                    mixed.append(("chat", chat(*documents[n % len(documents)], CHAT_QUERIES[n % len(CHAT_QUERIES)])))
+                mixed.append(("show_documents", show(sessions[i % len(sessions)])))
+            mixed.extend(("refresh", refresh_chain(session)) for session in sessions)
+            random.Random(args.seed).shuffle(mixed)
+            await run_mixed("mixed", mixed, args.concurrency, results)
+
+        metrics = await client.get("/metrics")
+        if metrics.status_code == 200:
+            results["server_metrics_bytes"] = len(metrics.content)
+
+    return results
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("the API server exited during startup")
+        try:
+            if httpx.get(f"{base_url}/health/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"the API server was not ready after {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=30)
+    parser.add_argument("--paragraphs", type=int, default=40)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--refreshes", type=int, default=5)
+    parser.add_argument("--shows", type=int, default=50)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--mixed-rounds", type=int, default=10,
+                        help="uploads in the mixed phase, each with --mixed-chats-per-upload chats and one /ShowDocuments")
+    parser.add_argument("--mixed-chats-per-upload", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    parser.add_argument("--output", help="also write the json report to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dps_bench_")
+    os.makedirs(os.path.join(workdir, "db"))
+    corpus = generate_corpus(os.path.join(workdir, "corpus"), args.files, args.paragraphs, args.seed)
+    corpus_bytes = sum(os.path.getsize(path) for path, _ in corpus)
+
+    fake_groq = start_fake_groq(0, args.llm_latency_ms / 1000)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "GROQ_API_KEY": "benchmark",
+        "GROQ_BASE_URL": f"http://127.0.0.1:{fake_groq.server_address[1]}",
+        "SECRET_KEY": env.get("SECRET_KEY", "benchmark"),
+        # measures raw capacity, set RATE_LIMIT_ENABLED=true to benchmark with admission control
+        "RATE_LIMIT_ENABLED": env.get("RATE_LIMIT_ENABLED", "false"),
+    })
+
+    log = open(os.path.join(workdir, "server.log"), "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+    try:
+        startup = time.perf_counter()
+        wait_until_ready(base_url, server, args.startup_timeout)
+        startup_seconds = time.perf_counter() - startup
+
+        disk_before = directory_size(workdir) - corpus_bytes
+        with RssSampler(server.pid) as sampler:
+            results = asyncio.run(drive(base_url, corpus, args))
+        disk_after = directory_size(workdir) - corpus_bytes
+
+        report = {
+            "config": vars(args),
+            "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                            "cpus": os.cpu_count()},
+            "corpus": {"files": len(corpus), "bytes": corpus_bytes},
+            "startup_seconds": round(startup_seconds, 2),
+            "peak_rss_bytes": sampler.peak,
+            "disk_growth_bytes": disk_after - disk_before,
+            "endpoints": results,
+        }
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+        fake_groq.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: query embedding micro batching under concurrent /chat traffic
+
+python -m benchmarks.bench_query_batching --concurrency 200 --requests 2000 --max-wait-ms 2 --max-batch 32
+
+every simulated request embeds one query, like similarity_search does for /chat.
+runs the same load once against the plain model and once through MicroBatchedEmbeddings
+and reports throughput and p50/p99 latency for both
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from services.document_processor import build_local_embeddings
+from services.micro_batcher import MicroBatchedEmbeddings
+
+
+QUERIES = [
+    "What is machine learning?",
+    "Summarise the second section of the document",
+    "Who are the authors and what is their affiliation?",
+    "List the main risks mentioned in the report",
+    "How does the proposed method compare to the baseline?",
+    "What are the payment terms in this contract?",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_load(embeddings, concurrency: int, requests: int) -> dict:
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        embeddings.embed_query(f"{QUERIES[i % len(QUERIES)]} #{i}")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "throughput_qps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    model = build_local_embeddings()
+    model.embed_query("warm up")
+
+    batched = MicroBatchedEmbeddings(model, args.max_batch, args.max_wait_ms)
+    batched_result = run_load(batched, args.concurrency, args.requests)
+    batched_result["forward_passes"] = batched.batcher.batches
+    batched_result["mean_batch_size"] = round(batched.batcher.items / max(batched.batcher.batches, 1), 2)
+
+    result = {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "max_batch": args.max_batch,
+        "max_wait_ms": args.max_wait_ms,
+        "unbatched": run_load(model, args.concurrency, args.requests),
+        "batched": batched_result
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
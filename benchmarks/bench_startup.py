@@ -0,0 +1,88 @@
+"""
+Startup budget check
+
+python -m benchmarks.bench_startup --import-budget 2.0 --ready-budget 30
+
+- import_seconds: wall time of `import app.main` in a fresh interpreter, must stay under --import-budget
+  (this is what every worker boot pays before it can serve /login)
+- heavy_modules_loaded: torch / sentence_transformers / langchain_huggingface must not be imported by then
+- ready_seconds (with --ready): time until document_processor.warm_up() finishes, i.e. /health/ready turns 200
+
+exits with status 1 when a budget is exceeded. tests/test_startup.py runs the import check under pytest
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["torch", "sentence_transformers", "langchain_huggingface", "langchain_chroma", "chromadb"]
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+import_seconds = time.perf_counter() - start
+result = {{"import_seconds": import_seconds, "heavy_modules_loaded": [m for m in {heavy} if m in sys.modules]}}
+if {ready}:
+    from services.document_processor import document_processor
+    start = time.perf_counter()
+    document_processor.warm_up()
+    result["ready_seconds"] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def measure(ready: bool, cwd: str = ROOT) -> dict:
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "benchmark")
+    env.setdefault("SECRET_KEY", "benchmark")
+    env["PREWARM_EMBEDDINGS"] = "false"
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(heavy=HEAVY_MODULES, ready=ready)],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--import-budget", type=float, default=2.0)
+    parser.add_argument("--ready-budget", type=float, default=30.0)
+    parser.add_argument("--ready", action="store_true", help="also time the model warm up")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [measure(args.ready) for _ in range(args.runs)]
+    result = {
+        "import_seconds": min(r["import_seconds"] for r in runs),
+        "heavy_modules_loaded": sorted({m for r in runs for m in r["heavy_modules_loaded"]}),
+        "import_budget": args.import_budget
+    }
+    if args.ready:
+        result["ready_seconds"] = min(r["ready_seconds"] for r in runs)
+        result["ready_budget"] = args.ready_budget
+
+    failures = []
+    if result["import_seconds"] > args.import_budget:
+        failures.append(f"import took {result['import_seconds']:.2f}s, budget {args.import_budget}s")
+    if result["heavy_modules_loaded"]:
+        failures.append(f"heavy modules imported eagerly: {result['heavy_modules_loaded']}")
+    if args.ready and result["ready_seconds"] > args.ready_budget:
+        failures.append(f"warm up took {result['ready_seconds']:.2f}s, budget {args.ready_budget}s")
+
+    result["failures"] = failures
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
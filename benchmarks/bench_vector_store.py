@@ -0,0 +1,183 @@
+"""
+Benchmark: quantized memmap store vs the chroma path
+
+python -m benchmarks.bench_vector_store --chunks 200000 --queries 500 --precision int8
+
+reports for every backend:
+- index_bytes   memory the index needs to answer a query. quantized: the codes (+ scales), the rest is
+                paged in on demand. chroma: measured size of the persisted hnsw segment files, hnswlib loads
+                them into memory entirely
+- disk_bytes    everything the backend wrote to disk
+- qps           single query throughput
+- recall_at_5   overlap with an exact float32 brute force top 5
+
+the vectors are synthetic (normalized gaussian clusters, 384 dims like MiniLM) so the model is not needed.
+the queries are held out points of the same clusters with a little noise, not new random directions.
+pass --skip-chroma when chromadb is not installed
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import numpy as np
+from langchain_core.documents import Document as LCDocument
+
+from services.quantized_store import QuantizedVectorStore
+
+
+class PrecomputedEmbeddings:
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return self.vectors
+
+    def embed_query(self, text):
+        raise NotImplementedError("the benchmark searches by vector")
+
+
+def synthetic_vectors(count: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # a few clusters so the neighbourhoods look more like real text than pure noise
+    centers = rng.standard_normal((64, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, 64, count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def synthetic_queries(held_out: np.ndarray, seed: int, noise: float = 0.3) -> np.ndarray:
+    # held out points of the same clusters, perturbed like a paraphrase: the queries land in the indexed
+    # neighbourhoods the way a real question lands near the chunks that answer it
+    rng = np.random.default_rng(seed)
+    scale = noise / np.sqrt(held_out.shape[1])
+    queries = held_out + scale * rng.standard_normal(held_out.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int):
+    return [set(np.argsort(-(vectors @ q))[:k].tolist()) for q in queries]
+
+
+def recall(found, truth):
+    return sum(len(f & t) for f, t in zip(found, truth)) / sum(len(t) for t in truth)
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def bench_quantized(vectors, queries, truth, k, precision, rerank_factor, directory):
+    documents = [LCDocument(page_content=str(i), metadata={"chunk_index": i}) for i in range(len(vectors))]
+
+    start = time.perf_counter()
+    QuantizedVectorStore.from_documents(
+        documents,
+        PrecomputedEmbeddings(vectors),
+        collection_name=f"bench_{precision}",
+        directory=directory,
+        precision=precision
+    )
+    build_seconds = time.perf_counter() - start
+
+    store = QuantizedVectorStore(f"bench_{precision}", None, directory)
+    store.search_ids(queries[0], k, rerank_factor)
+
+    found = []
+    start = time.perf_counter()
+    for q in queries:
+        indices, _ = store.search_ids(q, k, rerank_factor)
+        found.append(set(indices))
+    elapsed = time.perf_counter() - start
+
+    hot_bytes = store._codes.nbytes + (store._scales.nbytes if store._scales is not None else 0)
+    return {
+        "backend": f"quantized-{precision}",
+        "index_bytes": int(hot_bytes),
+        "disk_bytes": directory_size(store.path),
+        "build_seconds": round(build_seconds, 3),
+        "qps": round(len(queries) / elapsed, 1),
+        "recall_at_5": round(recall(found, truth), 4)
+    }
+
+
+def bench_chroma(vectors, queries, truth, k, directory):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=directory)
+    collection = client.create_collection("bench_chroma", metadata={"hnsw:space": "cosine"})
+
+    start = time.perf_counter()
+    batch = 5000
+    for i in range(0, len(vectors), batch):
+        collection.add(
+            ids=[str(j) for j in range(i, min(i + batch, len(vectors)))],
+            embeddings=vectors[i:i + batch].tolist()
+        )
+    build_seconds = time.perf_counter() - start
+
+    found = []
+    start = time.perf_counter()
+    for q in queries:
+        result = collection.query(query_embeddings=[q.tolist()], n_results=k)
+        found.append({int(i) for i in result["ids"][0]})
+    elapsed = time.perf_counter() - start
+
+    # chroma.sqlite3 (documents, metadata, write ahead log) sits at the top, every hnsw segment in its own directory
+    hnsw_bytes = sum(
+        directory_size(os.path.join(directory, entry))
+        for entry in os.listdir(directory)
+        if os.path.isdir(os.path.join(directory, entry))
+    )
+
+    return {
+        "backend": "chroma",
+        "index_bytes": hnsw_bytes,
+        "disk_bytes": directory_size(directory),
+        "build_seconds": round(build_seconds, 3),
+        "qps": round(len(queries) / elapsed, 1),
+        "recall_at_5": round(recall(found, truth), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--precision", choices=["float16", "int8", "both"], default="both")
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--skip-chroma", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # one draw, so data and queries share the cluster centres; the queries are never indexed themselves
+    points = synthetic_vectors(args.chunks + args.queries, args.dim, args.seed)
+    vectors = points[:args.chunks]
+    queries = synthetic_queries(points[args.chunks:], args.seed + 1)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    precisions = ["float16", "int8"] if args.precision == "both" else [args.precision]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for precision in precisions:
+            results.append(bench_quantized(vectors, queries, truth, args.k, precision, args.rerank_factor, directory))
+        if not args.skip_chroma:
+            results.append(bench_chroma(vectors, queries, truth, args.k, os.path.join(directory, "chroma")))
+
+    print(json.dumps({"chunks": args.chunks, "dim": args.dim, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Synthetic corpus for the benchmarks
+
+python -m benchmarks.corpus --out /tmp/corpus --files 30 --paragraphs 40
+
+writes an even mix of .pdf, .docx and .txt files built from a fixed vocabulary with a seeded rng,
+so two runs with the same arguments produce byte identical files.
+pdf and docx are written by hand (single font pdf, minimal word/document.xml package),
+no reportlab / python-docx needed
+"""
+import argparse
+import os
+import random
+import zipfile
+from typing import List, Tuple
+from xml.sax.saxutils import escape
+
+
+WORDS = (
+    "document system vector embedding retrieval model query answer context chunk token index "
+    "latency throughput storage memory cache network request response server client batch "
+    "contract payment invoice report revenue growth market customer product service policy "
+    "research method result baseline experiment dataset training evaluation accuracy error"
+).split()
+
+# file extension -> content type the /uploadFile endpoint expects
+CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "docx",
+    ".txt": "txt",
+}
+
+
+def make_paragraphs(rng: random.Random, count: int) -> List[str]:
+    paragraphs = []
+    for i in range(count):
+        if i % 8 == 0:
+            paragraphs.append(f"Section {i // 8 + 1}: {' '.join(rng.choices(WORDS, k=4)).title()}")
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            words = rng.choices(WORDS, k=rng.randint(8, 18))
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraphs.append(" ".join(sentences))
+    return paragraphs
+
+
+def write_txt(path: str, paragraphs: List[str]):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs))
+
+
+def write_docx(path: str, paragraphs: List[str]):
+    body = "".join(f"<w:p><w:r><w:t>{escape(p)}</w:t></w:r></w:p>" for p in paragraphs)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ))
+        docx.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/>'
+            '</Relationships>'
+        ))
+        docx.writestr("word/document.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'
+        ))
+
+
+def _pdf_lines(paragraphs: List[str], width: int = 90) -> List[str]:
+    lines = []
+    for paragraph in paragraphs:
+        line = ""
+        for word in paragraph.split():
+            if len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        lines.append(line)
+        lines.append("")
+    return lines
+
+
+def write_pdf(path: str, paragraphs: List[str], lines_per_page: int = 50):
+    lines = _pdf_lines(paragraphs)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects: List[Tuple[int, bytes]] = []
+    page_ids = []
+    font_id = 3
+    next_id = 4
+    for page_lines in pages:
+        text = "".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T* "
+            for line in page_lines
+        )
+        stream = f"BT /F1 10 Tf 14 TL 50 780 Td {text}ET".encode("latin-1")
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects.append((content_id, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+        objects.append((page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()))
+        page_ids.append(page_id)
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()),
+        (font_id, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"),
+    ] + objects
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id, body in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n" % object_id + body + b"\nendobj\n"
+
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in range(1, len(objects) + 1):
+        output += b"%010d 00000 n \n" % offsets[object_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+WRITERS = {".pdf": write_pdf, ".docx": write_docx, ".txt": write_txt}
+
+
+def generate_corpus(out_dir: str, files: int, paragraphs: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """Returns [(path, content type)] for the generated files."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    extensions = list(WRITERS)
+
+    generated = []
+    for i in range(files):
+        extension = extensions[i % len(extensions)]
+        path = os.path.join(out_dir, f"doc_{i:05d}{extension}")
+        WRITERS[extension](path, make_paragraphs(rng, paragraphs))
+        generated.append((path, CONTENT_TYPES[extension]))
+    return generated
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--files", type=int, default=30)
+    parser.add_argument("--paragraphs", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for path, _ in generate_corpus(args.out, args.files, args.paragraphs, args.seed):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
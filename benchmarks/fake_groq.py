@@ -0,0 +1,83 @@
+"""
+Local stand in for the Groq API
+
+python -m benchmarks.fake_groq --port 8899 --latency-ms 300
+
+answers POST /openai/v1/chat/completions in the OpenAI/Groq response format after a fixed delay,
+point the app at it with GROQ_BASE_URL=http://127.0.0.1:8899 (see chat_groq_model)
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    latency = 0.3
+    answer = "This is a canned answer from the fake Groq server."
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+        completion_tokens = len(self.answer.split())
+        body = json.dumps({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_groq(port: int = 0, latency: float = 0.3) -> ThreadingHTTPServer:
+    """Starts the server in a daemon thread, port 0 picks a free one (server.server_address[1])."""
+    handler = type("ConfiguredFakeGroqHandler", (FakeGroqHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-groq", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    server = start_fake_groq(args.port, args.latency_ms / 1000)
+    print(f"Fake Groq listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
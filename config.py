@@ -7,17 +7,66 @@ class Settings(BaseSettings):
 
 
     groq_api_key: str = Field(..., env="GROQ_API_KEY")
+    GROQ_BASE_URL: Optional[str] = None    # None = api.groq.com, benchmarks point this at benchmarks/fake_groq.py
     secret_key : str
     UPLOAD_DIR: str = "./uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  
     ALLOWED_EXTENSIONS: list = [".pdf", ".docx", ".txt"]
+    INGEST_WORKERS: int = 4    # thread pool that processes the documents of bulk uploads
+    BULK_MAX_FILES: int = 10000
+    BULK_MAX_BYTES: int = 1024 * 1024 * 1024    # extracted size of one /uploadFiles batch
     
     CHROMA_DB_DIR: str = "./chroma_db"
+
+    VECTOR_STORE_BACKEND: str = "chroma"    # "chroma" or "quantized"
+    QUANTIZED_STORE_DIR: str = "./quantized_db"
+    VECTOR_STORE_PRECISION: str = "int8"    # "float16" or "int8"
+    RERANK_FACTOR: int = 4    # shortlist size = k * RERANK_FACTOR before the exact re-rank
     
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
-    CHUNK_SIZE: int = 1000  
+    CHUNK_SIZE: int = 1000    # CHUNK_UNIT=characters
     CHUNK_OVERLAP: int = 200 
+    CHUNK_UNIT: str = "tokens"    # "tokens" (embedding model tokenizer) or "characters"
+    CHUNK_TOKENS: int = 250    # all-MiniLM-L6-v2 truncates at 256 word pieces incl. [CLS]/[SEP]
+    CHUNK_TOKEN_OVERLAP: int = 25    # only used when a single paragraph has to be cut
+    CHUNK_STRATEGIES: dict = {    # file type -> "recursive" | "structure" | "page"
+        "application/pdf": "structure",
+        "docx": "structure",
+        "txt": "recursive",
+    }
     EMBEDDING_DIMENSION : Optional [int] = None
+    EMBEDDING_BACKEND: str = "local"    # "local" (model in every worker) or "sidecar" (shared process on a unix socket)
+    EMBEDDING_SOCKET_PATH: str = "/tmp/dps_embeddings.sock"
+    EMBEDDING_SIDECAR_TIMEOUT_SECONDS: float = 120.0    # per sub-request of at most EMBEDDING_BATCH_MAX_SIZE texts
+    EMBEDDING_BATCH_MAX_SIZE: int = 64
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+    QUERY_BATCH_ENABLED: bool = True    # micro-batch concurrent /chat query embeddings in the local backend
+    QUERY_BATCH_MAX_SIZE: int = 32
+    QUERY_BATCH_MAX_WAIT_MS: float = 2.0
+    PREWARM_EMBEDDINGS: bool = True    # load the model in a background thread at startup instead of on the first upload/chat
+    PREWARM_RETRY_INITIAL_SECONDS: float = 1.0    # a failed warm up is retried, the delay doubles up to the max
+    PREWARM_RETRY_MAX_SECONDS: float = 30.0
+
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024    # pre-serialized /ShowDocuments and chunk page bodies
+
+    METRICS_ENABLED: bool = True    # stage timers, /metrics and the Server-Timing header
+
+    CONVERSATION_MAX_SESSIONS: int = 10000
+    CONVERSATION_TTL_SECONDS: float = 30 * 60
+    CONVERSATION_HISTORY_TURNS: int = 4    # turns repeated in the prompt
+    CONVERSATION_REUSE_THRESHOLD: float = 0.85    # cosine to the last question / prefetched answer above which its chunks are reused
+    CONVERSATION_PREFETCH: bool = False    # embed + search every answer in the background for the next turn
+    CONVERSATION_WORKERS: int = 8
+
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    ADMISSION_MAX_WAIT_SECONDS: float = 5.0    # longest a request may queue for a token or a slot before the 429
+    CHAT_RATE_PER_MINUTE: float = 30
+    CHAT_BURST: int = 10
+    CHAT_MAX_CONCURRENCY: int = 16    # per process
+    UPLOAD_RATE_PER_MINUTE: float = 10
+    UPLOAD_BURST: int = 5
+    UPLOAD_MAX_CONCURRENCY: int = 4
 
     OPENAI_API_KEY: Optional[str] = None
     LLM_MODEL: str = "gpt-3.5-turbo"
@@ -195,10 +195,11 @@ els.showDocsBtn.addEventListener("click", async () => {
   els.docsOutput.textContent = "Loading...";
   els.docsList.innerHTML = "";
   try {
-    logRequest("POST /ShowDocuments", "Bearer auth");
+    logRequest("GET /ShowDocuments", "Bearer auth");
+    // GET so the browser revalidates with If-None-Match and gets a 304 when nothing changed
     const data = await apiFetch("/ShowDocuments", {
-      method: "POST",
-      headers: { "Content-Type": "application/json", ...authHeaders() },
+      method: "GET",
+      headers: authHeaders(),
     });
     els.docsOutput.textContent = pretty(data);
     const docs = data?.documents || [];
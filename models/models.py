@@ -63,7 +63,57 @@ class BlacklistedAccessTokens(Base):
 
     user = relationship("User" , back_populates= "blacklisted_tokens")
 
-    
+class IngestBatch(Base):
+
+    __tablename__ = "ingest_batches"
+
+    batch_id : Mapped[str] = mapped_column(primary_key=True)
+    user_id : Mapped[int] = mapped_column(ForeignKey("users.id") , nullable=False)
+    created_at : Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    finished_at : Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    total_files : Mapped[int] = mapped_column(default=0)
+    completed_files : Mapped[int] = mapped_column(default=0)
+    failed_files : Mapped[int] = mapped_column(default=0)
+    total_bytes : Mapped[int] = mapped_column(default=0)
+    status : Mapped[str] = mapped_column(default="processing")
+
+    items = relationship("IngestBatchItem" , back_populates="batch" , cascade="all, delete-orphan")
+
+class IngestBatchItem(Base):
+
+    __tablename__ = "ingest_batch_items"
+
+    id : Mapped[int] = mapped_column(primary_key=True)
+    batch_id : Mapped[str] = mapped_column(ForeignKey("ingest_batches.batch_id") , index=True)
+    document_id : Mapped[Optional[int]] = mapped_column(ForeignKey("documents.file_id") , nullable=True)
+    file_name : Mapped[str] = mapped_column()
+    status : Mapped[str] = mapped_column(default="pending")
+    error : Mapped[Optional[str]] = mapped_column(nullable=True)
+
+    batch = relationship("IngestBatch" , back_populates="items")
+
+class ChatSession(Base):
+
+    __tablename__ = "chat_sessions"
 
+    session_id : Mapped[str] = mapped_column(primary_key=True)
+    user_id : Mapped[int] = mapped_column(ForeignKey("users.id") , nullable=False , index=True)
+    document_id : Mapped[int] = mapped_column(ForeignKey("documents.file_id") , nullable=False)
+    collection_name : Mapped[str] = mapped_column()
+    created_at : Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    updated_at : Mapped[datetime] = mapped_column(default=datetime.utcnow)
 
+    turns = relationship("ChatTurn" , back_populates="session" , cascade="all, delete-orphan")
+
+class ChatTurn(Base):
+
+    __tablename__ = "chat_turns"
+
+    id : Mapped[int] = mapped_column(primary_key=True)
+    session_id : Mapped[str] = mapped_column(ForeignKey("chat_sessions.session_id") , index=True)
+    turn : Mapped[int] = mapped_column()
+    query : Mapped[str] = mapped_column()
+    answer : Mapped[str] = mapped_column()
+    created_at : Mapped[datetime] = mapped_column(default=datetime.utcnow)
 
+    session = relationship("ChatSession" , back_populates="turns")
@@ -32,4 +32,15 @@ class ChatRequest(BaseModel):
             }
         }
 
+class ChatSessionRequest(BaseModel):
+    document_id: int
+
+class ChatMessageRequest(BaseModel):
+    query: str
 
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "query": "And what does it say about the results?"
+            }
+        }
@@ -0,0 +1,369 @@
+import os
+import re
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from config import settings
+from db.db import SessionLocal
+from models.models import Document, IngestBatch, IngestBatchItem
+from services.document_processor import document_processor
+from services.metrics import BYTES_INGESTED
+
+
+"""
+Bulk ingestion
+
+POST /uploadFiles takes many files and/or .zip/.tar(.gz) archives, up to BULK_MAX_FILES parts in one
+multipart request (the form is parsed with that limit instead of starlette's default of 1000):
+1. every upload is copied in 1MB blocks from the spooled temp file to uploads/batch_<id>/ (never fully in memory)
+   with MAX_FILE_SIZE per file (larger files are skipped) and BULK_MAX_BYTES for the whole batch
+2. archives are unpacked next to it, only supported extensions, no absolute paths / "..", same size limits.
+   BULK_MAX_FILES and BULK_MAX_BYTES are checked while unpacking, the batch is rejected as soon as one is crossed
+3. one transaction inserts the IngestBatch, every Document row and an IngestBatchItem per file
+4. the documents are processed on a shared thread pool (INGEST_WORKERS), each task with its own db session;
+   the batch counters are bumped with UPDATE ... SET x = x + 1 so concurrent tasks don't overwrite each other.
+   sqlite has a single writer, a "database is locked" while recording a result is retried, and a task that
+   still fails is logged and its item recorded as failed so the batch can't stay "processing"
+
+GET /uploadFiles/{batch_id} reports the aggregate progress
+"""
+
+FILE_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "docx",
+    ".txt": "txt",
+}
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+COPY_BLOCK_SIZE = 1024 * 1024
+FINISH_ATTEMPTS = 3
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.INGEST_WORKERS, thread_name_prefix="ingest")
+    return _executor
+
+
+def file_type_for(name: str) -> Optional[str]:
+    return FILE_TYPES.get(os.path.splitext(name)[1].lower())
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def safe_file_name(name: str) -> str:
+    name = os.path.basename(name.replace("\\", "/"))
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name) or "file"
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+def save_stream(source, destination: str, limit: Optional[int] = None) -> int:
+    """Copies source to destination in blocks, raises FileTooLarge (and removes the file) past limit bytes."""
+    written = 0
+    with open(destination, "wb") as f:
+        while True:
+            block = source.read(COPY_BLOCK_SIZE)
+            if not block:
+                break
+            written += len(block)
+            if limit is not None and written > limit:
+                break
+            f.write(block)
+
+    if limit is not None and written > limit:
+        os.remove(destination)
+        raise FileTooLarge(f"larger than {limit} bytes")
+    return written
+
+
+def _unique_path(directory: str, index: int, name: str) -> str:
+    return os.path.join(directory, f"{index:05d}_{safe_file_name(name)}")
+
+
+def extract_archive(
+    archive_path: str,
+    directory: str,
+    start_index: int,
+    max_files: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Unpacks the supported files of a zip/tar archive, returns (extracted [(path, name)], skipped [(name, reason)]).
+
+    Raises ValueError as soon as the batch would go over max_files files or max_bytes bytes.
+    """
+    extracted, skipped = [], []
+    index = start_index
+    bytes_left = max_bytes
+
+    def accept(name: str, size: int) -> Optional[str]:
+        normalized = name.replace("\\", "/")
+        if normalized.startswith("/") or ".." in normalized.split("/"):
+            return "unsafe path"
+        if file_type_for(name) is None:
+            return "unsupported file type"
+        if size > settings.MAX_FILE_SIZE:
+            return f"larger than {settings.MAX_FILE_SIZE} bytes"
+        return None
+
+    def extract(source, name: str, size: int):
+        nonlocal index, bytes_left
+        if max_files is not None and index >= max_files:
+            raise ValueError(f"Batch has more than {max_files} files")
+        if bytes_left is not None and size > bytes_left:
+            raise ValueError(f"Batch is larger than {max_bytes} bytes")
+
+        # the sizes in the archive header are not trusted, the copy itself stops at the limit
+        limit = settings.MAX_FILE_SIZE if bytes_left is None else min(settings.MAX_FILE_SIZE, bytes_left)
+        path = _unique_path(directory, index, name)
+        try:
+            written = save_stream(source, path, limit)
+        except FileTooLarge as e:
+            if bytes_left is not None and bytes_left < settings.MAX_FILE_SIZE:
+                raise ValueError(f"Batch is larger than {max_bytes} bytes")
+            skipped.append((name, str(e)))
+            return
+        if bytes_left is not None:
+            bytes_left -= written
+        extracted.append((path, os.path.basename(name)))
+        index += 1
+
+    if archive_path.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+                reason = accept(member.filename, member.file_size)
+                if reason:
+                    skipped.append((member.filename, reason))
+                    continue
+                with archive.open(member) as source:
+                    extract(source, member.filename, member.file_size)
+    else:
+        with tarfile.open(archive_path) as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                reason = accept(member.name, member.size)
+                if reason:
+                    skipped.append((member.name, reason))
+                    continue
+                extract(archive.extractfile(member), member.name, member.size)
+
+    return extracted, skipped
+
+
+def batch_directory(user_id: int, batch_id: str) -> str:
+    return os.path.join(settings.UPLOAD_DIR, f"batch_{user_id}_{batch_id}")
+
+
+def discard_batch(user_id: int, batch_id: str):
+    """Removes the staged files of a batch that was not created."""
+    shutil.rmtree(batch_directory(user_id, batch_id), ignore_errors=True)
+
+
+def stage_uploads(uploads, user_id: int, batch_id: str) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Writes the uploaded files (and the content of archives) to disk, returns (files [(path, name)], skipped).
+
+    Raises ValueError when the batch goes over BULK_MAX_FILES or BULK_MAX_BYTES, on any error nothing is kept on disk.
+    """
+    directory = batch_directory(user_id, batch_id)
+    os.makedirs(directory, exist_ok=True)
+
+    files, skipped = [], []
+    total_bytes = 0
+    try:
+        for upload in uploads:
+            name = upload.filename or "file"
+            bytes_left = settings.BULK_MAX_BYTES - total_bytes
+
+            if is_archive(name):
+                archive_path = os.path.join(directory, f"archive_{safe_file_name(name)}")
+                try:
+                    BYTES_INGESTED.inc(save_stream(upload.file, archive_path, bytes_left))
+                    extracted, archive_skipped = extract_archive(
+                        archive_path, directory, len(files), settings.BULK_MAX_FILES, bytes_left
+                    )
+                except FileTooLarge:
+                    raise ValueError(f"Batch is larger than {settings.BULK_MAX_BYTES} bytes")
+                except (zipfile.BadZipFile, tarfile.TarError) as e:
+                    skipped.append((name, f"invalid archive: {e}"))
+                    continue
+                finally:
+                    if os.path.exists(archive_path):
+                        os.remove(archive_path)
+                files.extend(extracted)
+                skipped.extend(archive_skipped)
+                total_bytes += sum(os.path.getsize(path) for path, _ in extracted)
+
+            elif file_type_for(name) is not None:
+                if len(files) >= settings.BULK_MAX_FILES:
+                    raise ValueError(f"Batch has more than {settings.BULK_MAX_FILES} files")
+                path = _unique_path(directory, len(files), name)
+                try:
+                    size = save_stream(upload.file, path, min(settings.MAX_FILE_SIZE, bytes_left))
+                except FileTooLarge as e:
+                    if bytes_left < settings.MAX_FILE_SIZE:
+                        raise ValueError(f"Batch is larger than {settings.BULK_MAX_BYTES} bytes")
+                    skipped.append((name, str(e)))
+                    continue
+                BYTES_INGESTED.inc(size)
+                total_bytes += size
+                files.append((path, name))
+
+            else:
+                skipped.append((name, "unsupported file type"))
+    except Exception:
+        discard_batch(user_id, batch_id)
+        raise
+
+    return files, skipped
+
+
+def create_batch(files: List[Tuple[str, str]], user_id: int, batch_id: str, db: Session) -> List[Tuple[int, int, str, str]]:
+    """Inserts the batch, its documents and items in a single transaction, returns [(item id, document id, path, type)]."""
+    now = datetime.utcnow()
+    sizes = [os.path.getsize(path) for path, _ in files]
+
+    batch = IngestBatch(
+        batch_id=batch_id,
+        user_id=user_id,
+        created_at=now,
+        total_files=len(files),
+        total_bytes=sum(sizes),
+        status="processing" if files else "completed",
+        finished_at=None if files else now
+    )
+    documents = [
+        Document(user_id=user_id, file_size=str(size), file_path=path, upload_time=now)
+        for (path, _), size in zip(files, sizes)
+    ]
+
+    try:
+        db.add(batch)
+        db.add_all(documents)
+        db.flush()
+
+        items = [
+            IngestBatchItem(batch_id=batch_id, document_id=document.file_id, file_name=name)
+            for document, (_, name) in zip(documents, files)
+        ]
+        db.add_all(items)
+        db.flush()
+
+        tasks = [
+            (item.id, document.file_id, path, file_type_for(path))
+            for item, document, (path, _) in zip(items, documents, files)
+        ]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return tasks
+
+
+def _finish_item(db: Session, batch_id: str, item_id: int, error: Optional[str]):
+    counter = IngestBatch.failed_files if error else IngestBatch.completed_files
+    db.execute(
+        update(IngestBatchItem)
+        .where(IngestBatchItem.id == item_id)
+        .values(status="failed" if error else "completed", error=error)
+    )
+    db.execute(
+        update(IngestBatch)
+        .where(IngestBatch.batch_id == batch_id)
+        .values({counter.key: counter + 1})
+    )
+    # whoever finishes the last file closes the batch
+    db.execute(
+        update(IngestBatch)
+        .where(
+            IngestBatch.batch_id == batch_id,
+            IngestBatch.completed_files + IngestBatch.failed_files >= IngestBatch.total_files,
+            IngestBatch.status == "processing"
+        )
+        .values(status="completed", finished_at=datetime.utcnow())
+    )
+    db.commit()
+
+
+def _record_result(batch_id: str, item_id: int, error: Optional[str]):
+    # sqlite takes one writer at a time, INGEST_WORKERS tasks finishing together can hit "database is locked"
+    for attempt in range(FINISH_ATTEMPTS):
+        db = SessionLocal()
+        try:
+            _finish_item(db, batch_id, item_id, error)
+            return
+        except OperationalError:
+            db.rollback()
+            if attempt == FINISH_ATTEMPTS - 1:
+                raise
+        finally:
+            db.close()
+        time.sleep(0.5 * 2 ** attempt)
+
+
+def ingest_one(batch_id: str, item_id: int, document_id: int, file_path: str, file_type: str, user_id: int):
+    db = SessionLocal()
+    error = None
+    try:
+        document_processor.process_and_store_document_chromadb(
+            file_path=file_path,
+            file_type=file_type,
+            user_id=user_id,
+            document_id=document_id,
+            db=db
+        )
+    except Exception as e:
+        db.rollback()
+        error = str(e)
+        db.execute(update(Document).where(Document.file_id == document_id).values(processing_status="failed"))
+        db.commit()
+    finally:
+        db.close()
+
+    _record_result(batch_id, item_id, error)
+
+
+def _on_item_done(future, batch_id: str, item_id: int):
+    error = future.exception()
+    if error is None:
+        return
+
+    print(f"Error: bulk ingest of item {item_id} in batch {batch_id} failed: {error}")
+    try:
+        _record_result(batch_id, item_id, f"internal error: {error}")
+    except Exception as e:
+        print(f"Error: could not record the failure of item {item_id} in batch {batch_id}: {e}")
+
+
+def start_batch(tasks, batch_id: str, user_id: int):
+    executor = get_executor()
+    for item_id, document_id, path, file_type in tasks:
+        future = executor.submit(ingest_one, batch_id, item_id, document_id, path, file_type, user_id)
+        future.add_done_callback(lambda f, item_id=item_id: _on_item_done(f, batch_id, item_id))
+
+
+def new_batch_id() -> str:
+    return uuid.uuid4().hex
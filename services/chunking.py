@@ -0,0 +1,215 @@
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+from config import settings
+
+
+"""
+Chunking strategies
+
+the strategy is picked per file type (settings.CHUNK_STRATEGIES, e.g. {"application/pdf": "structure"}):
+- recursive   the old RecursiveCharacterTextSplitter behaviour, fixed size + overlap
+- structure   split on headings and paragraphs, then pack whole paragraphs into chunks up to the size limit.
+              a heading always starts a new chunk and is repeated at the top of every chunk of its section,
+              consecutive headings are merged, a heading without any text after it becomes a chunk of its own.
+              only paragraphs that are too long on their own are cut (recursively, with overlap)
+- page        like structure but a chunk never crosses a pdf page
+
+sizes are measured with settings.CHUNK_UNIT:
+- tokens      word pieces of the embedding model's tokenizer, limit CHUNK_TOKENS / CHUNK_TOKEN_OVERLAP.
+              all-MiniLM-L6-v2 truncates at 256 tokens, so a 1000 character chunk (~220-300 tokens)
+              often loses its tail silently
+- characters  len(), limit CHUNK_SIZE / CHUNK_OVERLAP
+"""
+
+STRATEGIES = ("recursive", "structure", "page")
+
+_HEADING_PATTERNS = [
+    re.compile(r"^#{1,6}\s+\S"),                                           # markdown
+    re.compile(r"^(chapter|section|part|appendix)\s+[\w.]+", re.IGNORECASE),
+    re.compile(r"^\d+(\.\d+)*\.?\s+[A-Z]"),                                # 1. / 2.3 Title
+]
+
+
+def is_heading(block: str) -> bool:
+    block = block.strip()
+    if not block or "\n" in block or len(block) > 80:
+        return False
+    if any(p.match(block) for p in _HEADING_PATTERNS):
+        return True
+    if block.endswith((".", ",", ";", ":", "?", "!")):
+        return False
+    # short ALL CAPS line
+    letters = [c for c in block if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters)
+
+
+def split_blocks(text: str) -> List[str]:
+    result = []
+    for block in re.split(r"\n\s*\n", text):
+        # pdf text separates lines with single newlines, a whole page often comes as one block,
+        # so every line is checked. inside a block a line only counts as a heading after the end
+        # of a sentence, a wrapped line that happens to start with "2019 Revenue" stays in its paragraph
+        lines = []
+        for line in block.split("\n"):
+            line = line.strip()
+            if not line:
+                continue
+            starts_section = not lines or lines[-1].endswith((".", ":", "!", "?"))
+            if starts_section and is_heading(line):
+                if lines:
+                    result.append("\n".join(lines))
+                    lines = []
+                result.append(line)
+            else:
+                lines.append(line)
+        if lines:
+            result.append("\n".join(lines))
+    return result
+
+
+class _TokenCounter:
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # the tokenizers package only (rust, a few MB), not transformers/torch
+        from tokenizers import Tokenizer
+
+        tokenizer = Tokenizer.from_pretrained(self.model_name)
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        return tokenizer
+
+    def __call__(self, text: str) -> int:
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    self._tokenizer = self._load()
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+class Chunker:
+
+    def __init__(self):
+        self._splitters: Dict[str, object] = {}
+        self._token_counter = _TokenCounter(settings.EMBEDDING_MODEL)
+
+    @property
+    def length_function(self) -> Callable[[str], int]:
+        return self._token_counter if settings.CHUNK_UNIT == "tokens" else len
+
+    @property
+    def chunk_size(self) -> int:
+        return settings.CHUNK_TOKENS if settings.CHUNK_UNIT == "tokens" else settings.CHUNK_SIZE
+
+    @property
+    def chunk_overlap(self) -> int:
+        return settings.CHUNK_TOKEN_OVERLAP if settings.CHUNK_UNIT == "tokens" else settings.CHUNK_OVERLAP
+
+    def strategy_for(self, file_type: str) -> str:
+        strategy = settings.CHUNK_STRATEGIES.get(file_type, "recursive")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unsupported chunking strategy: {strategy}, expected one of {STRATEGIES}")
+        return strategy
+
+    def _recursive_splitter(self, chunk_size: Optional[int] = None):
+        chunk_size = chunk_size or self.chunk_size
+        overlap = min(self.chunk_overlap, chunk_size // 2)
+        key = f"{settings.CHUNK_UNIT}:{chunk_size}:{overlap}"
+        splitter = self._splitters.get(key)
+        if splitter is None:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+            splitter = self._splitters[key] = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=overlap,
+                length_function=self.length_function,
+                separators=["\n\n", "\n", " ", ""]
+            )
+        return splitter
+
+    def warm_up(self):
+        self.length_function("warm up")
+        self._recursive_splitter()
+
+    def split(self, documents: List, file_type: str, strategy: Optional[str] = None) -> List:
+        strategy = strategy or self.strategy_for(file_type)
+        if strategy == "recursive":
+            return self._recursive_splitter().split_documents(documents)
+        return self._split_structured(documents, per_page=strategy == "page")
+
+    def _split_structured(self, documents: List, per_page: bool) -> List:
+        from langchain_core.documents import Document as LCDocument
+
+        size = self.chunk_size
+        length = self.length_function
+        chunks = []
+
+        state = {"heading": None, "heading_used": False, "heading_metadata": None,
+                 "parts": [], "tokens": 0, "metadata": None}
+
+        def flush():
+            if state["parts"]:
+                body = "\n\n".join(state["parts"])
+                text = f"{state['heading']}\n\n{body}" if state["heading"] else body
+                metadata = dict(state["metadata"])
+                if state["heading"]:
+                    metadata["section"] = state["heading"]
+                    state["heading_used"] = True
+                chunks.append(LCDocument(page_content=text, metadata=metadata))
+            state["parts"], state["tokens"] = [], 0
+
+        def flush_heading():
+            # a heading no paragraph followed (title page, last line of the document) is indexed on its own
+            if state["heading"] and not state["heading_used"]:
+                metadata = dict(state["heading_metadata"], section=state["heading"])
+                chunks.append(LCDocument(page_content=state["heading"], metadata=metadata))
+                state["heading_used"] = True
+
+        def heading_cost():
+            return length(state["heading"]) + 1 if state["heading"] else 0
+
+        for document in documents:
+            if per_page:
+                flush()
+                flush_heading()
+
+            for block in split_blocks(document.page_content):
+                if is_heading(block):
+                    flush()
+                    previous = state["heading"]
+                    if previous and not state["heading_used"] and length(previous) + length(block) + 1 <= size // 2:
+                        # consecutive headings ("2. RESULTS" then "2.1 Latency") become one section title
+                        state["heading"] = f"{previous}\n{block}"
+                    else:
+                        flush_heading()
+                        state["heading"], state["heading_metadata"] = block, document.metadata
+                    state["heading_used"] = False
+                    continue
+
+                block_tokens = length(block)
+                budget = size - heading_cost()
+
+                if block_tokens > budget:
+                    flush()
+                    state["metadata"] = document.metadata
+                    for piece in self._recursive_splitter(budget).split_text(block):
+                        state["parts"], state["tokens"] = [piece], length(piece)
+                        flush()
+                    continue
+
+                if state["parts"] and state["tokens"] + block_tokens + 1 > budget:
+                    flush()
+                if not state["parts"]:
+                    state["metadata"] = document.metadata
+                state["parts"].append(block)
+                state["tokens"] += block_tokens + 1
+
+        flush()
+        flush_heading()
+        return chunks
@@ -0,0 +1,320 @@
+import math
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.models import ChatSession, ChatTurn
+from services.metrics import CACHE_HITS, CACHE_MISSES, stage
+
+
+"""
+Conversations (multi turn chat against one document)
+
+the durable part of a session (user, document, every turn) is in the chat_sessions / chat_turns tables,
+so any uvicorn worker can serve any turn. each process also keeps hot state per session: the last query
+embedding + the chunks it retrieved, and a speculative prefetch. a turn goes:
+
+1. rewrite      a follow up ("and the second one?", "why is that") is expanded with the previous question,
+                cheap heuristic, no extra LLM call
+2. retrieval    the embedding of the question as asked is compared with the last question and with the prefetch:
+                cosine >= CONVERSATION_REUSE_THRESHOLD -> those hot chunks are reused, no vector store search.
+                otherwise the rewritten query is searched
+3. llm          chat_groq_model with the history + chunks
+4. prefetch     (CONVERSATION_PREFETCH, off by default) in the background the answer is embedded and searched.
+                it costs a forward pass of a long, truncated text on the shared model per turn and a question
+                rarely gets within the threshold of an answer, turn it on only if dps_cache_hits_total{cache="conversation_prefetched"} shows hits
+
+a turn on a worker without hot state for the session starts cold (plain search) instead of failing.
+hot state is LRU (CONVERSATION_MAX_SESSIONS per process), sessions idle for CONVERSATION_TTL_SECONDS expire
+"""
+
+_FOLLOW_UP_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their", "he", "she", "him", "her",
+    "there", "then", "also", "more", "else", "same", "above", "previous", "former", "latter", "one",
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.CONVERSATION_WORKERS, thread_name_prefix="conversation")
+    return _executor
+
+
+def build_chat_prompt(document_id: int, context: str, query: str, history: str = "") -> str:
+    history_block = f"""
+    Conversation so far:
+    {history}
+    """ if history else ""
+
+    return f"""
+    You are a helpful assistant. Answer the question based on the context below.
+    {history_block}
+    Context from document '{document_id}':
+    {context}
+
+    Question: {query}
+
+    Answer: Provide a helpful answer based only on the context above.
+    If the answer is not in the context, say "I cannot find this information in the document."
+    """
+
+
+def cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def rewrite_query(query: str, history: List[Tuple[str, str]]) -> str:
+    if not history:
+        return query
+
+    words = re.findall(r"[a-z']+", query.lower())
+    is_follow_up = len(words) <= 4 or bool(_FOLLOW_UP_WORDS.intersection(words)) or query.lower().startswith(("and ", "what about", "how about", "why"))
+    if not is_follow_up:
+        return query
+
+    previous_query = history[-1][0]
+    return f"{previous_query} {query}"
+
+
+class HotState:
+    """What this process remembers about a session between turns, losing it only costs a search."""
+
+    def __init__(self):
+        self.last_embedding: Optional[List[float]] = None
+        self.last_chunks: List = []
+        self.prefetch: Optional[Future] = None
+        self.used_at = time.time()
+        self.lock = threading.Lock()
+
+
+class ConversationSession:
+    """A session as read from the db for one request, plus the hot state of this process."""
+
+    def __init__(self, record: ChatSession, history: List[Tuple[str, str]], turn_count: int, hot: HotState):
+        self.session_id = record.session_id
+        self.user_id = record.user_id
+        self.document_id = record.document_id
+        self.collection_name = record.collection_name
+        self.created_at = record.created_at
+        self.updated_at = record.updated_at
+
+        self.history = history
+        self.turn_count = turn_count
+        self.hot = hot
+
+    def history_text(self) -> str:
+        turns = self.history[-settings.CONVERSATION_HISTORY_TURNS:]
+        return "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+
+
+class ConversationStore:
+
+    def __init__(self, max_sessions: int, ttl_seconds: float):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._hot: "OrderedDict[str, HotState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _hot_state(self, session_id: str) -> HotState:
+        now = time.time()
+        with self._lock:
+            hot = self._hot.get(session_id)
+            if hot is None:
+                hot = self._hot[session_id] = HotState()
+            hot.used_at = now
+            self._hot.move_to_end(session_id)
+
+            while self._hot:
+                oldest_id, oldest = next(iter(self._hot.items()))
+                if now - oldest.used_at <= self.ttl_seconds and len(self._hot) <= self.max_sessions:
+                    break
+                del self._hot[oldest_id]
+            return hot
+
+    def _drop_hot_state(self, session_id: str):
+        with self._lock:
+            self._hot.pop(session_id, None)
+
+    def _delete_records(self, db: Session, session_ids: List[str]):
+        if not session_ids:
+            return
+        db.query(ChatTurn).filter(ChatTurn.session_id.in_(session_ids)).delete(synchronize_session=False)
+        db.query(ChatSession).filter(ChatSession.session_id.in_(session_ids)).delete(synchronize_session=False)
+
+    def create(self, db: Session, user_id: int, document_id: int, collection_name: str) -> ConversationSession:
+        now = datetime.utcnow()
+
+        # expired sessions of the user are cleaned up here, so the tables don't grow without bound
+        expired = db.query(ChatSession.session_id).filter(
+            ChatSession.user_id == user_id,
+            ChatSession.updated_at < now - timedelta(seconds=self.ttl_seconds)
+        ).all()
+
+        record = ChatSession(
+            session_id=uuid.uuid4().hex,
+            user_id=user_id,
+            document_id=document_id,
+            collection_name=collection_name,
+            created_at=now,
+            updated_at=now
+        )
+        try:
+            self._delete_records(db, [session_id for (session_id,) in expired])
+            db.add(record)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return ConversationSession(record, [], 0, self._hot_state(record.session_id))
+
+    def get(self, db: Session, session_id: str, user_id: int, full_history: bool = False) -> Optional[ConversationSession]:
+        record = db.query(ChatSession).filter(
+            ChatSession.session_id == session_id,
+            ChatSession.user_id == user_id
+        ).first()
+        if record is None:
+            return None
+
+        if datetime.utcnow() - record.updated_at > timedelta(seconds=self.ttl_seconds):
+            self.delete(db, session_id, user_id)
+            return None
+
+        turns = db.query(ChatTurn).filter(ChatTurn.session_id == session_id).order_by(ChatTurn.turn.desc())
+        if not full_history:
+            turns = turns.limit(settings.CONVERSATION_HISTORY_TURNS)
+        turns = turns.all()[::-1]
+
+        history = [(turn.query, turn.answer) for turn in turns]
+        turn_count = turns[-1].turn if turns else 0
+        return ConversationSession(record, history, turn_count, self._hot_state(session_id))
+
+    def add_turn(self, db: Session, session: ConversationSession, query: str, answer: str):
+        now = datetime.utcnow()
+        try:
+            db.add(ChatTurn(session_id=session.session_id, turn=session.turn_count, query=query, answer=answer, created_at=now))
+            db.query(ChatSession).filter(ChatSession.session_id == session.session_id).update({"updated_at": now})
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        session.updated_at = now
+
+    def delete(self, db: Session, session_id: str, user_id: int) -> bool:
+        record = db.query(ChatSession).filter(
+            ChatSession.session_id == session_id,
+            ChatSession.user_id == user_id
+        ).first()
+        if record is None:
+            return False
+
+        try:
+            self._delete_records(db, [session_id])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        self._drop_hot_state(session_id)
+        return True
+
+
+conversation_store = ConversationStore(settings.CONVERSATION_MAX_SESSIONS, settings.CONVERSATION_TTL_SECONDS)
+
+
+def _search(vector_store, embedding: List[float], k: int) -> List:
+    return vector_store.similarity_search_by_vector(embedding, k=k)
+
+
+def _prefetch(vector_store, embeddings, text: str, k: int):
+    embedding = embeddings.embed_query(text)
+    return embedding, _search(vector_store, embedding, k)
+
+
+def retrieve(hot: HotState, vector_store, embeddings, query: str, search_query: str, k: int) -> Tuple[List, str, List[float]]:
+    """Returns (chunks, source, query embedding), source is "reused", "prefetched" or "searched".
+
+    reuse is decided on the question as asked, not on search_query: a rewritten follow up contains the
+    previous question word for word and would match the last turn almost every time ("and 2020?" after
+    "revenue for 2019?"), answering from the old chunks. search_query is only embedded for a real search.
+    """
+    embedding = embeddings.embed_query(query)
+    threshold = settings.CONVERSATION_REUSE_THRESHOLD
+
+    candidates = []
+    if hot.last_embedding is not None and hot.last_chunks:
+        candidates.append((cosine(embedding, hot.last_embedding), "reused", hot.last_chunks))
+
+    prefetch = hot.prefetch
+    if prefetch is not None and prefetch.done() and prefetch.exception() is None:
+        prefetch_embedding, prefetch_chunks = prefetch.result()
+        if prefetch_chunks:
+            candidates.append((cosine(embedding, prefetch_embedding), "prefetched", prefetch_chunks))
+
+    best = max(candidates, key=lambda candidate: candidate[0], default=None)
+    if best is not None and best[0] >= threshold:
+        CACHE_HITS.inc(cache=f"conversation_{best[1]}")    # conversation_reused / conversation_prefetched
+        return best[2][:k], best[1], embedding
+
+    CACHE_MISSES.inc(cache="conversation")
+    search_embedding = embedding if search_query == query else embeddings.embed_query(search_query)
+    return _search(vector_store, search_embedding, k), "searched", embedding
+
+
+def answer_turn(session: ConversationSession, query: str, vector_store, embeddings, llm, k: int = 5) -> Dict:
+    """Runs one turn, the caller stores it with conversation_store.add_turn."""
+    hot = session.hot
+    with hot.lock:
+        with stage("rewrite"):
+            search_query = rewrite_query(query, session.history)
+
+        with stage("retrieval"):
+            chunks, source, embedding = retrieve(hot, vector_store, embeddings, query, search_query, k)
+
+        context = "\n\n".join(chunk.page_content for chunk in chunks)
+        prompt = build_chat_prompt(session.document_id, context, query, session.history_text())
+
+        with stage("llm"):
+            answer = llm(prompt, context)
+
+        session.history.append((query, answer))
+        session.turn_count += 1
+        hot.last_embedding = embedding
+        hot.last_chunks = chunks
+
+        if settings.CONVERSATION_PREFETCH:
+            hot.prefetch = get_executor().submit(_prefetch, vector_store, embeddings, answer, k)
+
+        return {
+            "session_id": session.session_id,
+            "turn": session.turn_count,
+            "query": query,
+            "search_query": search_query,
+            "retrieval": source,
+            "answer": answer,
+            "source_document": session.document_id,
+            "relevant_chunks_count": len(chunks),
+            "chunks_used": [
+                {
+                    "content": chunk.page_content[:200] + "...",
+                    "chunk_index": chunk.metadata.get('chunk_index'),
+                    "relevance_score": chunk.metadata.get('score', 'N/A')
+                }
+                for chunk in chunks
+            ]
+        }
@@ -1,35 +1,91 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
 import os
+import threading
+import time
 import uuid
-from typing import List, Dict
+from typing import List, Dict, Optional
 from config import settings
 from models.models import Document
+from services.chunking import Chunker
+from services.metrics import stage, TimedEmbeddings, CHUNKS_EMBEDDED, DOCUMENTS_INGESTED
 from sqlalchemy.orm import Session
 
 
+"""
+langchain, torch and the sentence-transformers model are imported/loaded on first use and not when this module is imported,
+so `import app.main` stays cheap and the workers can answer /login while the model is still loading.
+warm_up() is called from the startup hook when settings.PREWARM_EMBEDDINGS is on, /health/ready reports is_ready.
+with EMBEDDING_BACKEND=sidecar the model lives in services/embedding_sidecar.py and this process only holds a socket client
+"""
+
+
+def build_local_embeddings():
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name=settings.EMBEDDING_MODEL,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+
 class DocumentProcessor:
     
     def __init__(self):
         
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=settings.EMBEDDING_MODEL,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        self._embeddings = None
+        self.chunker = Chunker()
+        self._lock = threading.Lock()
 
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        self.load_error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
         
         os.makedirs(settings.CHROMA_DB_DIR, exist_ok=True)
+        if settings.VECTOR_STORE_BACKEND == "quantized":
+            os.makedirs(settings.QUANTIZED_STORE_DIR, exist_ok=True)
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = self._load_embeddings()
+        return self._embeddings
+
+    @property
+    def is_ready(self) -> bool:
+        return self._embeddings is not None
+
+    def _load_embeddings(self):
+        start = time.perf_counter()
+        try:
+            if settings.EMBEDDING_BACKEND == "sidecar":
+                from services.embedding_sidecar import SidecarEmbeddings
+
+                embeddings = SidecarEmbeddings(settings.EMBEDDING_SOCKET_PATH)
+                embeddings.embed_query("ping")
+            else:
+                embeddings = build_local_embeddings()
+                if settings.QUERY_BATCH_ENABLED:
+                    from services.micro_batcher import MicroBatchedEmbeddings
+
+                    embeddings = MicroBatchedEmbeddings(embeddings)
+            if settings.METRICS_ENABLED:
+                embeddings = TimedEmbeddings(embeddings)
+        except Exception as e:
+            self.load_error = str(e)
+            raise
+        self.load_seconds = time.perf_counter() - start
+        self.load_error = None
+        return embeddings
+
+    def warm_up(self):
+        # one forward pass so the first /chat doesn't pay for the lazy torch init either
+        self.embeddings.embed_query("warm up")
+        self.chunker.warm_up()
     
     def load_document(self, file_path: str, file_type: str) -> List:
+        from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+
         if file_type == "application/pdf":
             loader = PyPDFLoader(file_path)
             
@@ -75,9 +131,11 @@ class DocumentProcessor:
         db:Session
     ) -> Dict:
         try:
-            documents = self.load_document(file_path, file_type)
+            with stage("load_document"):
+                documents = self.load_document(file_path, file_type)
             
-            chunks = self.text_splitter.split_documents(documents)
+            with stage("split_documents"):
+                chunks = self.chunker.split(documents, file_type)
             
             for i, chunk in enumerate(chunks):
                 chunk.metadata.update({
@@ -89,20 +147,19 @@ class DocumentProcessor:
             
             collection_name = f"user_{user_id}_doc_{document_id}_{uuid.uuid4().hex[:8]}"
             
-            vector_store = Chroma.from_documents(
-                documents=chunks,
-                embedding=self.embeddings,
-                collection_name=collection_name,
-                persist_directory=settings.CHROMA_DB_DIR
-            )
-            stored_count = vector_store._collection.count()
+            # index = embedding (also reported on its own as "embed") + the vector store write
+            with stage("index"):
+                self.create_vector_store(chunks, collection_name)
+            CHUNKS_EMBEDDED.inc(len(chunks))
 
-            self.store_in_db(
-                file_id=document_id,
-                collection_name=collection_name,
-                chunk_count=len(chunks),
-                db=db
-            )
+            with stage("store_in_db"):
+                self.store_in_db(
+                    file_id=document_id,
+                    collection_name=collection_name,
+                    chunk_count=len(chunks),
+                    db=db
+                )
+            DOCUMENTS_INGESTED.inc(status="completed")
             
             return {
                 "file_id " : document_id,
@@ -112,9 +169,44 @@ class DocumentProcessor:
             }
             
         except Exception as e:
+            DOCUMENTS_INGESTED.inc(status="failed")
             raise Exception(f"Failed to process document: {str(e)}")
     
+    def create_vector_store(self, chunks: List, collection_name: str):
+        if settings.VECTOR_STORE_BACKEND == "quantized":
+            from services.quantized_store import QuantizedVectorStore
+
+            return QuantizedVectorStore.from_documents(
+                documents=chunks,
+                embedding=self.embeddings,
+                collection_name=collection_name,
+                directory=settings.QUANTIZED_STORE_DIR,
+                precision=settings.VECTOR_STORE_PRECISION
+            )
+
+        from langchain_chroma import Chroma
+
+        return Chroma.from_documents(
+            documents=chunks,
+            embedding=self.embeddings,
+            collection_name=collection_name,
+            persist_directory=settings.CHROMA_DB_DIR
+        )
+
     def get_vector_store(self, collection_name: str):
+        # picked by where the collection was written, not by VECTOR_STORE_BACKEND: documents stored before the
+        # setting was switched keep working. a quantized collection is a directory, everything else is in chroma
+        from services.quantized_store import QuantizedVectorStore
+
+        if QuantizedVectorStore.exists(collection_name, settings.QUANTIZED_STORE_DIR):
+            return QuantizedVectorStore(
+                collection_name=collection_name,
+                embedding_function=self.embeddings,
+                directory=settings.QUANTIZED_STORE_DIR
+            )
+
+        from langchain_chroma import Chroma
+
         return Chroma(
             collection_name=collection_name,
             embedding_function=self.embeddings,
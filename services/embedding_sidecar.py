@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from array import array
+from typing import List, Optional
+
+from config import settings
+from services.micro_batcher import MicroBatcher
+
+
+"""
+Embedding sidecar
+
+one process owns the sentence-transformers model and serves every uvicorn worker over a unix socket:
+
+    python -m services.embedding_sidecar            # start the sidecar
+    EMBEDDING_BACKEND=sidecar uvicorn app.main:app --workers 4
+
+the workers only hold SidecarEmbeddings (stdlib socket client), so torch is never imported in them.
+requests coming from different workers/connections within EMBEDDING_BATCH_MAX_WAIT_MS are coalesced
+into one embed_documents call of at most EMBEDDING_BATCH_MAX_SIZE texts. the client already sends a document
+in sub-requests of that size and MicroBatcher cuts anything larger, so queries get in between the pieces.
+a request is only resent when it never reached the sidecar, a timeout (EMBEDDING_SIDECAR_TIMEOUT_SECONDS) is raised
+
+wire format (both directions): 4 byte big endian length + payload
+- request   json {"texts": [...]}
+- response  json header {"count": n, "dim": d} or {"error": "..."}, followed for success by n*d float32 (little endian)
+"""
+
+_HEADER = struct.Struct(">I")
+
+
+def _send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        part = sock.recv(size - len(data))
+        if not part:
+            raise ConnectionError("embedding sidecar closed the connection")
+        data.extend(part)
+    return bytes(data)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return _recv_exact(sock, size)
+
+
+class SidecarEmbeddings:
+    """Embeddings client used by the API workers, same interface as HuggingFaceEmbeddings."""
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = None,
+                 max_batch: Optional[int] = None):
+        self.socket_path = socket_path or settings.EMBEDDING_SOCKET_PATH
+        self.timeout = timeout or settings.EMBEDDING_SIDECAR_TIMEOUT_SECONDS
+        self.max_batch = max_batch or settings.EMBEDDING_BATCH_MAX_SIZE
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _send(self, payload: bytes) -> socket.socket:
+        # resent once on a fresh connection if the sidecar restarted, but only while nothing reached it:
+        # once the request is out a failure (timeout included) is raised, a resend would make the sidecar
+        # compute the same texts twice
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                _send_frame(sock, payload)
+                return sock
+            except socket.timeout:
+                self._close()
+                raise
+            except (ConnectionError, OSError):
+                self._close()
+                if attempt == 1:
+                    raise
+
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        sock = self._send(json.dumps({"texts": texts}).encode("utf-8"))
+
+        try:
+            header = json.loads(_recv_frame(sock))
+            if "error" in header:
+                raise RuntimeError(f"Embedding sidecar failed: {header['error']}")
+
+            count, dim = header["count"], header["dim"]
+            flat = array("f")
+            flat.frombytes(_recv_exact(sock, count * dim * 4))
+        except (ConnectionError, OSError):
+            # the reply may be half read, the connection can't be reused
+            self._close()
+            raise
+
+        return [flat[i * dim:(i + 1) * dim].tolist() for i in range(count)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # sub-requests of at most max_batch texts: each one fits the timeout and the sidecar can
+        # serve the query embeddings of the other workers in between
+        texts = list(texts)
+        vectors = []
+        for start in range(0, len(texts), self.max_batch):
+            vectors.extend(self._request(texts[start:start + self.max_batch]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._request([text])[0]
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        while True:
+            try:
+                request = json.loads(_recv_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+
+            try:
+                texts = request["texts"]
+                vectors = self.server.coalescer.submit(texts).result() if texts else []
+            except Exception as e:
+                _send_frame(self.request, json.dumps({"error": str(e)}).encode("utf-8"))
+                continue
+
+            dim = len(vectors[0]) if vectors else 0
+            flat = array("f", (value for vector in vectors for value in vector))
+            try:
+                _send_frame(self.request, json.dumps({"count": len(vectors), "dim": dim}).encode("utf-8"))
+                self.request.sendall(flat.tobytes())
+            except OSError:
+                # the client timed out and closed its end
+                return
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, socket_path: str, embeddings, max_batch: int, max_wait: float):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.coalescer = MicroBatcher(embeddings.embed_documents, max_batch, max_wait, name="embedding-coalescer")
+        super().__init__(socket_path, _Handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the embedding model to the API workers over a unix socket")
+    parser.add_argument("--socket", default=settings.EMBEDDING_SOCKET_PATH)
+    parser.add_argument("--max-batch", type=int, default=settings.EMBEDDING_BATCH_MAX_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.EMBEDDING_BATCH_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    from services.document_processor import build_local_embeddings
+
+    embeddings = build_local_embeddings()
+    embeddings.embed_query("warm up")
+
+    server = EmbeddingServer(args.socket, embeddings, args.max_batch, args.max_wait_ms / 1000)
+    print(f"Embedding sidecar listening on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+
+
+"""
+Per stage timers and prometheus metrics
+
+    with stage("split_documents"):
+        chunks = ...
+
+- every stage is observed in the dps_stage_seconds histogram (label: stage)
+- inside a request the stages are also collected for the Server-Timing header (see the middleware in app/main.py)
+- render() gives the prometheus text format served on /metrics
+
+no prometheus_client dependency, the few metric types we need are below.
+with METRICS_ENABLED=false stage() returns a shared nullcontext, counters return right away and
+app/main.py registers neither the timing middleware nor /metrics
+"""
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+_NULL_CONTEXT = nullcontext()
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [bucket counts..., +Inf count, sum]
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                cumulative += series[len(self.buckets)]
+                bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: List = []
+
+STAGE_SECONDS = Histogram("dps_stage_seconds", "Time spent per processing stage", ("stage",))
+HTTP_REQUEST_SECONDS = Histogram("dps_http_request_seconds", "HTTP request latency", ("method", "path", "status"))
+CHUNKS_EMBEDDED = Counter("dps_chunks_embedded_total", "Chunks embedded and written to the vector store")
+BYTES_INGESTED = Counter("dps_bytes_ingested_total", "Bytes of uploaded documents")
+DOCUMENTS_INGESTED = Counter("dps_documents_ingested_total", "Documents processed", ("status",))
+CACHE_HITS = Counter("dps_cache_hits_total", "Cache hits", ("cache",))
+CACHE_MISSES = Counter("dps_cache_misses_total", "Cache misses", ("cache",))
+ADMISSION_DECISIONS = Counter("dps_admission_decisions_total", "Admission control outcomes", ("limit", "outcome"))
+
+
+class _StageTimer:
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, stage=self.name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.name, elapsed))
+        return False
+
+
+def stage(name: str):
+    if not settings.METRICS_ENABLED:
+        return _NULL_CONTEXT
+    return _StageTimer(name)
+
+
+class TimedEmbeddings:
+    """Embeddings proxy that records the forward passes as the embed / embed_query stages."""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts):
+        with stage("embed"):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with stage("embed_query"):
+            return self.embeddings.embed_query(text)
+
+
+def start_request_timings():
+    return _request_timings.set([])
+
+
+def finish_request_timings(token) -> str:
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+
+    # same stage hit several times (e.g. embed per batch) is summed into one entry
+    totals: Dict[str, float] = {}
+    for name, elapsed in timings:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in totals.items())
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
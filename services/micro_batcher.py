@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+from config import settings
+
+
+"""
+Micro batching
+
+the sync handlers (/chat runs in the threadpool) each embed one query string, one forward pass per request.
+MicroBatcher collects whatever is submitted within max_wait (or until max_batch items) and runs a single
+batched call, then hands every caller its own slice of the result through a Future.
+a submission larger than max_batch is cut into pieces of max_batch items, between two pieces the
+queue moves on, so a whole document being embedded doesn't hold back the small requests behind it
+
+used in-process in front of embed_query (MicroBatchedEmbeddings) and by the embedding sidecar
+to coalesce requests from the different workers
+"""
+
+
+class _Submission:
+
+    __slots__ = ("items", "future", "results", "offset")
+
+    def __init__(self, items: List, future: Future):
+        self.items = items
+        self.future = future
+        self.results = []
+        self.offset = 0
+
+
+class MicroBatcher:
+
+    def __init__(self, batch_fn: Callable[[List], List], max_batch: int, max_wait: float, name: str = "micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self.batches = 0
+        self.items = 0
+
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def submit(self, items: List) -> Future:
+        future = Future()
+        self._queue.put(_Submission(list(items), future))
+        return future
+
+    def _collect(self):
+        """Returns [(submission, start, end)] with at most max_batch items in total."""
+        submission = self._queue.get()
+        pending = []
+        size = 0
+        deadline = time.monotonic() + self.max_wait
+
+        while True:
+            take = min(len(submission.items) - submission.offset, self.max_batch - size)
+            pending.append((submission, submission.offset, submission.offset + take))
+            submission.offset += take
+            size += take
+
+            remaining = deadline - time.monotonic()
+            if size >= self.max_batch or remaining <= 0:
+                break
+            try:
+                submission = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            items = [item for submission, start, end in pending for item in submission.items[start:end]]
+
+            try:
+                results = self.batch_fn(items) if items else []
+                if len(results) != len(items):
+                    # slicing a short result would hand the later callers someone else's vectors
+                    raise RuntimeError(f"{self.batch_fn!r} returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for submission, _, _ in pending:
+                    if not submission.future.done():
+                        submission.future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+
+            offset = 0
+            for submission, start, end in pending:
+                submission.results.extend(results[offset:offset + end - start])
+                offset += end - start
+                if submission.offset < len(submission.items):
+                    # the rest of an oversized submission goes to the back of the queue, whatever was
+                    # submitted while this batch ran (a /chat query) is served before its next piece
+                    self._queue.put(submission)
+                else:
+                    submission.future.set_result(submission.results)
+
+
+class MicroBatchedEmbeddings:
+    """Wraps an embeddings object so concurrent embed_query calls share one forward pass.
+
+    the batch goes through embed_documents, so encode_kwargs apply to the queries. a model with query
+    specific settings (HuggingFaceEmbeddings.query_encode_kwargs, e.g. a query prompt for e5/bge) would
+    lose them, such a model is passed through unbatched. all-MiniLM-L6-v2 has none
+    """
+
+    def __init__(self, embeddings, max_batch: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        self.embeddings = embeddings
+        self.batched = not getattr(embeddings, "query_encode_kwargs", None)
+        self.batcher = MicroBatcher(
+            embeddings.embed_documents,
+            max_batch or settings.QUERY_BATCH_MAX_SIZE,
+            (max_wait_ms if max_wait_ms is not None else settings.QUERY_BATCH_MAX_WAIT_MS) / 1000,
+            name="query-embedding-batcher"
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # ingestion already sends whole documents, no point in queueing those
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        if not self.batched:
+            return self.embeddings.embed_query(text)
+        return self.batcher.submit([text]).result()[0]
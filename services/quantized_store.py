@@ -0,0 +1,191 @@
+import json
+import os
+import shutil
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document as LCDocument
+
+from config import settings
+
+
+"""
+Reduced precision vector store
+
+layout of one collection on disk (settings.QUANTIZED_STORE_DIR/<collection_name>/):
+- full.npy      float32 vectors, only touched when re-ranking the shortlist
+- codes.npy     float16 vectors or int8 codes, this is the part that stays hot in RAM
+- scales.npy    one float32 scale per vector (int8 only)
+- chunks.jsonl  one json line per chunk: id, page_content, metadata
+- offsets.npy   byte offset of every line in chunks.jsonl (+ the file size)
+
+all the arrays are opened with mmap_mode="r" so the OS page cache decides what is resident,
+the float32 file is only read for the k * RERANK_FACTOR rows of the shortlist and only the lines
+of the hits are read from chunks.jsonl, a query never loads the text of the whole document
+"""
+
+PRECISIONS = ("float16", "int8")
+SCAN_BLOCK_ROWS = 65536
+
+
+def quantize(vectors: np.ndarray, precision: str):
+    vectors = np.asarray(vectors, dtype=np.float32)
+
+    if precision == "float16":
+        return vectors.astype(np.float16), None
+
+    if precision == "int8":
+        # symmetric per vector scale, the embeddings are normalized so the range is small
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    raise ValueError(f"Unsupported precision: {precision}, expected one of {PRECISIONS}")
+
+
+class QuantizedVectorStore:
+
+    def __init__(self, collection_name: str, embedding_function, directory: Optional[str] = None):
+        self.collection_name = collection_name
+        self.embedding_function = embedding_function
+        self.path = os.path.join(directory or settings.QUANTIZED_STORE_DIR, collection_name)
+
+        self._codes = None
+        self._scales = None
+        self._full = None
+        self._offsets = None
+
+    @staticmethod
+    def exists(collection_name: str, directory: Optional[str] = None) -> bool:
+        return os.path.exists(os.path.join(directory or settings.QUANTIZED_STORE_DIR, collection_name, "offsets.npy"))
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: List[LCDocument],
+        embedding,
+        collection_name: str,
+        directory: Optional[str] = None,
+        precision: Optional[str] = None
+    ) -> "QuantizedVectorStore":
+        store = cls(collection_name, embedding, directory)
+        texts = [doc.page_content for doc in documents]
+        vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+        store.write(vectors, documents, precision or settings.VECTOR_STORE_PRECISION)
+        return store
+
+    def write(self, vectors: np.ndarray, documents: List[LCDocument], precision: str):
+        os.makedirs(self.path, exist_ok=True)
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(documents), -1)
+        codes, scales = quantize(vectors, precision)
+
+        np.save(os.path.join(self.path, "full.npy"), vectors)
+        np.save(os.path.join(self.path, "codes.npy"), codes)
+        if scales is not None:
+            np.save(os.path.join(self.path, "scales.npy"), scales)
+
+        offsets = [0]
+        with open(os.path.join(self.path, "chunks.jsonl"), "wb") as f:
+            for i, doc in enumerate(documents):
+                line = json.dumps({
+                    "id": f"{self.collection_name}_{i}",
+                    "page_content": doc.page_content,
+                    "metadata": doc.metadata
+                }).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.save(os.path.join(self.path, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+        self._codes = self._scales = self._full = self._offsets = None
+
+    def _load(self):
+        if self._offsets is not None:
+            return
+
+        offsets_path = os.path.join(self.path, "offsets.npy")
+        if not os.path.exists(offsets_path):
+            raise ValueError(f"Collection {self.collection_name} not found")
+
+        self._offsets = np.load(offsets_path, mmap_mode="r")
+        self._codes = np.load(os.path.join(self.path, "codes.npy"), mmap_mode="r")
+        self._full = np.load(os.path.join(self.path, "full.npy"), mmap_mode="r")
+
+        scales_path = os.path.join(self.path, "scales.npy")
+        if os.path.exists(scales_path):
+            self._scales = np.load(scales_path, mmap_mode="r")
+
+    def _read_records(self, indices: List[int]) -> List[Dict]:
+        records = {}
+        with open(os.path.join(self.path, "chunks.jsonl"), "rb") as f:
+            for index in sorted(set(indices)):
+                start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+                f.seek(start)
+                records[index] = json.loads(f.read(end - start))
+        return [records[index] for index in indices]
+
+    def count(self) -> int:
+        self._load()
+        return len(self._offsets) - 1
+
+    def get(self, limit: Optional[int] = None, offset: int = 0) -> Dict:
+        total = self.count()
+        end = total if limit is None else min(total, offset + limit)
+        records = self._read_records(list(range(offset, end)))
+        return {
+            "ids": [record["id"] for record in records],
+            "documents": [record["page_content"] for record in records],
+            "metadatas": [record["metadata"] for record in records]
+        }
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        # scored in blocks so the float32 upcast never holds the whole index at once
+        total = self._codes.shape[0]
+        scores = np.empty(total, dtype=np.float32)
+        for start in range(0, total, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, total)
+            scores[start:end] = self._codes[start:end].astype(np.float32) @ query
+        if self._scales is not None:
+            scores *= self._scales
+        return scores
+
+    def search_ids(self, query: np.ndarray, k: int = 5, rerank_factor: Optional[int] = None):
+        total = self.count()
+        if total == 0:
+            return [], []
+
+        query = np.asarray(query, dtype=np.float32)
+        k = min(k, total)
+        shortlist_size = min(total, k * (rerank_factor or settings.RERANK_FACTOR))
+
+        # first pass over the compact codes, then exact scores for the shortlist only
+        approx = self._approximate_scores(query)
+        if shortlist_size < total:
+            shortlist = np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]
+        else:
+            shortlist = np.arange(total)
+        shortlist = np.sort(shortlist)
+
+        exact = np.asarray(self._full[shortlist], dtype=np.float32) @ query
+        order = np.argsort(-exact)[:k]
+        return shortlist[order].tolist(), exact[order].tolist()
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 5) -> List[LCDocument]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 5):
+        indices, scores = self.search_ids(np.asarray(embedding, dtype=np.float32), k)
+        records = self._read_records(indices)
+        return [
+            (LCDocument(page_content=record["page_content"], metadata=record["metadata"]), float(score))
+            for record, score in zip(records, scores)
+        ]
+
+    def similarity_search(self, query: str, k: int = 5) -> List[LCDocument]:
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector(embedding, k)
+
+    def delete_collection(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        self._codes = self._scales = self._full = self._offsets = None
@@ -0,0 +1,210 @@
+import asyncio
+import math
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+
+from auth.auth import get_current_user
+from config import settings
+from services.metrics import ADMISSION_DECISIONS, stage
+
+
+"""
+Admission control for the heavy endpoints (/uploadFile, /uploadFiles, /chat)
+
+two checks, both in front of the handler as a dependency around get_current_user:
+1. per user token bucket (RATE_PER_MINUTE, BURST). when the bucket is empty the request waits for its token
+   if that happens within ADMISSION_MAX_WAIT_SECONDS, otherwise it is rejected right away with 429 + Retry-After
+2. concurrency cap (MAX_CONCURRENCY in flight per endpoint group and process). a request queues for a slot
+   until the same deadline, then gets a 429
+
+the buckets live in a backend picked by RATE_LIMIT_BACKEND, only "memory" exists for now; a shared store
+(redis ...) can be added with register_backend() without touching the endpoints.
+decisions are counted in dps_admission_decisions_total, the waiting time is the admission_wait stage
+"""
+
+
+class RateLimitBackend(ABC):
+    """Async so a shared store (redis ...) can do network I/O without blocking the event loop."""
+
+    @abstractmethod
+    async def reserve(self, key: str, rate_per_second: float, burst: int, max_wait: float) -> Tuple[bool, float]:
+        """Takes a token now or reserves the next one if it is free within max_wait, returns (admitted, wait seconds)."""
+
+    @abstractmethod
+    async def refund(self, key: str, burst: int):
+        """Gives back a token taken by reserve(), for a request that was rejected afterwards."""
+
+
+class InMemoryBackend(RateLimitBackend):
+
+    MAX_KEYS = 100000
+
+    def __init__(self):
+        # key -> (tokens, last update, rate per second, burst), least recently updated first.
+        # every bucket keeps its own rate/burst, the chat and upload limits share this backend
+        self._buckets: "OrderedDict[str, Tuple[float, float, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def reserve(self, key: str, rate_per_second: float, burst: int, max_wait: float) -> Tuple[bool, float]:
+        # a dict update under a lock, nothing to await
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate_per_second)
+
+            wait = 0.0
+            if tokens < 1:
+                wait = (1 - tokens) / rate_per_second
+            admitted = wait <= max_wait
+            # when waiting, the token is spent ahead of time: the bucket goes negative and later callers wait longer
+            self._buckets[key] = (tokens - 1 if admitted else tokens, now, rate_per_second, burst)
+            self._buckets.move_to_end(key)
+
+            if bucket is None and len(self._buckets) > self.MAX_KEYS:
+                self._prune(now)
+            return admitted, wait
+
+    async def refund(self, key: str, burst: int):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                tokens, last, rate_per_second, bucket_burst = bucket
+                self._buckets[key] = (min(bucket_burst, tokens + 1), last, rate_per_second, bucket_burst)
+
+    def _prune(self, now: float):
+        # full buckets behave exactly like missing ones, dropping them changes nothing
+        full = [
+            key for key, (tokens, last, rate_per_second, burst) in self._buckets.items()
+            if tokens + (now - last) * rate_per_second >= burst
+        ]
+        for key in full:
+            del self._buckets[key]
+
+        # all of them in use: the least recently updated go, down to 90% so this doesn't run on every insert
+        while len(self._buckets) > self.MAX_KEYS * 0.9:
+            self._buckets.popitem(last=False)
+
+
+_BACKENDS = {"memory": InMemoryBackend}
+
+
+def register_backend(name: str, backend_class):
+    _BACKENDS[name] = backend_class
+
+
+def create_backend(name: Optional[str] = None) -> RateLimitBackend:
+    name = name or settings.RATE_LIMIT_BACKEND
+    if name not in _BACKENDS:
+        raise ValueError(f"Unsupported rate limit backend: {name}, expected one of {list(_BACKENDS)}")
+    return _BACKENDS[name]()
+
+
+def _too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class AdmissionController:
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int, max_concurrency: int, max_wait: float,
+                 backend: RateLimitBackend):
+        self.name = name
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.backend = backend
+        self.in_flight = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # created on first use so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def acquire(self, user_id: int):
+        deadline = time.monotonic() + self.max_wait
+
+        key = f"{self.name}:{user_id}"
+        admitted, wait = await self.backend.reserve(key, self.rate_per_second, self.burst, self.max_wait)
+        if not admitted:
+            ADMISSION_DECISIONS.inc(limit=self.name, outcome="rejected_rate")
+            raise _too_many_requests(f"Rate limit exceeded for {self.name}, try again later", wait)
+
+        with stage("admission_wait"):
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            semaphore = self._get_semaphore()
+            queued = wait > 0 or semaphore.locked()
+            if not semaphore.locked():
+                # free slot, acquire() returns without suspending
+                await semaphore.acquire()
+            else:
+                try:
+                    await asyncio.wait_for(semaphore.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    # the request never ran, it doesn't count against the user's rate
+                    await self.backend.refund(key, self.burst)
+                    ADMISSION_DECISIONS.inc(limit=self.name, outcome="rejected_concurrency")
+                    raise _too_many_requests(f"Too many {self.name} requests in progress, try again later", self.max_wait)
+
+        self.in_flight += 1
+        ADMISSION_DECISIONS.inc(limit=self.name, outcome="queued" if queued else "admitted")
+
+    def release(self):
+        self.in_flight -= 1
+        self._get_semaphore().release()
+
+
+def admission(controller: AdmissionController):
+    """Dependency that returns the current user once the request has been admitted."""
+
+    async def dependency(current_user = Depends(get_current_user)):
+        if not settings.RATE_LIMIT_ENABLED:
+            yield current_user
+            return
+
+        await controller.acquire(current_user.id)
+        try:
+            yield current_user
+        finally:
+            controller.release()
+
+    return dependency
+
+
+_backend = create_backend()
+
+chat_admission = AdmissionController(
+    "chat",
+    rate_per_minute=settings.CHAT_RATE_PER_MINUTE,
+    burst=settings.CHAT_BURST,
+    max_concurrency=settings.CHAT_MAX_CONCURRENCY,
+    max_wait=settings.ADMISSION_MAX_WAIT_SECONDS,
+    backend=_backend
+)
+
+upload_admission = AdmissionController(
+    "upload",
+    rate_per_minute=settings.UPLOAD_RATE_PER_MINUTE,
+    burst=settings.UPLOAD_BURST,
+    max_concurrency=settings.UPLOAD_MAX_CONCURRENCY,
+    max_wait=settings.ADMISSION_MAX_WAIT_SECONDS,
+    backend=_backend
+)
+
+chat_user = admission(chat_admission)
+upload_user = admission(upload_admission)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+
+from config import settings
+from services.metrics import CACHE_HITS, CACHE_MISSES
+
+
+"""
+Read through cache for the document listing / chunk endpoints
+
+a completed document never changes, so its version (file_id, collection, chunk count, status) is enough to
+derive an ETag without touching Chroma:
+- If-None-Match matches          -> 304, no Chroma read, no serialization
+- (key, etag) in the cache       -> the pre-serialized body is sent as is
+- otherwise the body is built, serialized once (orjson when installed) and cached
+
+the cache is an LRU bounded by the total size of the bodies (RESPONSE_CACHE_MAX_BYTES),
+entries of an older version are simply never hit again and age out
+"""
+
+try:
+    import orjson
+
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, default=str)
+except ImportError:
+    def dumps(content) -> bytes:
+        return json.dumps(content, default=str, separators=(",", ":")).encode("utf-8")
+
+
+class ResponseCache:
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_BYTES)
+
+
+def document_version(documents) -> str:
+    """ETag for a set of Document rows.
+
+    no Last-Modified: the rows only carry upload_time, the documents of a /uploadFiles batch all share it
+    and complete later, so the listing changes while the newest upload_time stays the same
+    """
+    digest = hashlib.sha1()
+    for doc in sorted(documents, key=lambda d: d.file_id):
+        digest.update(f"{doc.file_id}|{doc.collection_name}|{doc.chunk_count}|{doc.processing_status};".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def cached_response(request: Request, key: str, etag: str, build: Callable) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request, etag):
+        CACHE_HITS.inc(cache="not_modified")
+        return Response(status_code=304, headers=headers)
+
+    cache_key = f"{key}:{etag}"
+    body = response_cache.get(cache_key)
+    if body is None:
+        CACHE_MISSES.inc(cache="responses")
+        body = dumps(build())
+        response_cache.put(cache_key, body)
+    else:
+        CACHE_HITS.inc(cache="responses")
+
+    return Response(content=body, media_type="application/json", headers=headers)
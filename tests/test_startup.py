@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from benchmarks.bench_startup import HEAVY_MODULES, measure
+
+
+# wall time of `import app.main` in a fresh interpreter, what every worker boot pays before it serves /login
+IMPORT_BUDGET_SECONDS = float(os.environ.get("STARTUP_IMPORT_BUDGET_SECONDS", "2.0"))
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    # app.main creates the sqlite db and the upload / vector store directories relative to the cwd
+    os.makedirs(tmp_path / "db")
+    return str(tmp_path)
+
+
+def test_import_stays_within_budget(workdir):
+    pytest.importorskip("fastapi")
+
+    # best of three, the first run also pays for cold .pyc / page cache
+    runs = [measure(ready=False, cwd=workdir) for _ in range(3)]
+    import_seconds = min(run["import_seconds"] for run in runs)
+
+    assert import_seconds <= IMPORT_BUDGET_SECONDS, f"import app.main took {import_seconds:.2f}s"
+
+
+def test_heavy_modules_are_not_imported_at_startup(workdir):
+    pytest.importorskip("fastapi")
+
+    loaded = measure(ready=False, cwd=workdir)["heavy_modules_loaded"]
+
+    assert loaded == [], f"imported before the first request: {loaded} (expected none of {HEAVY_MODULES})"